@@ -0,0 +1,155 @@
+"""
+Бенчмарк агрегации статистики Toggl: циклы на чистом Python против pandas.
+
+Время pandas указано вместе со сборкой таблицы задач: из деталей задач
+и из строк хранилища, как её строит бот (workspace.get_task_frame).
+
+Запуск: python -m benchmarks.bench_aggregation [число задач ...]
+"""
+import sys
+import time
+import random
+import logging
+
+from telegram_bot.toggl.aggregation import build_task_frame, task_frame_from_rows, user_stats, project_stats
+from telegram_bot.toggl.task_store import report_values
+
+STATUSES = ["Done", "Blocked", "In progress", "To do", None]
+
+
+def make_dataset(num_tasks, num_members=40, num_projects=60, seed=42):
+    rnd = random.Random(seed)
+    members = [{"id": i, "membership_id": 1000 + i, "name": f"user{i}"} for i in range(num_members)]
+    projects = [f"Project {i}" for i in range(num_projects)]
+    details = []
+    for task_id in range(num_tasks):
+        detail = {
+            "id": task_id,
+            "plan_status": {"name": rnd.choice(STATUSES)},
+            "workspace_members": rnd.sample(range(1000, 1000 + num_members + 5), rnd.randint(0, 3)),
+        }
+        if rnd.random() > 0.1:
+            detail["project"] = {"name": rnd.choice(projects)}
+        details.append(detail)
+    members_by_id = {m['id']: m for m in members}
+    members_by_membership_id = {m['membership_id']: m for m in members}
+    return details, members_by_id, members_by_membership_id
+
+
+def legacy_user_stats(responses, members_by_id, members_by_membership_id):
+    # Прежняя реализация из stat_by_user.generate_stat_by_user
+    user_task_count = {member_id: 0 for member_id in members_by_id.keys()}
+    user_task_done_count = {member_id: 0 for member_id in members_by_id.keys()}
+    user_inprogress_tasks = {member_id: [] for member_id in members_by_id.keys()}
+    task_weights = {'Done': 0.8, 'In progress': 1.1}
+
+    for task_detail in responses:
+        if "error" not in task_detail:
+            workspace_members_ids = task_detail.get("workspace_members", [])
+            plan_status = task_detail.get("plan_status", {}).get("name")
+            for membership_id in workspace_members_ids:
+                if membership_id in members_by_membership_id:
+                    user_id = members_by_membership_id[membership_id]['id']
+                    user_task_count[user_id] += 1
+                    if plan_status == "Done":
+                        user_task_done_count[user_id] += 1
+                    elif plan_status == "In progress":
+                        user_inprogress_tasks[user_id].append(task_detail['id'])
+
+    table_data = []
+    for user_id, task_count in user_task_count.items():
+        task_done_count = user_task_done_count[user_id]
+        task_inprogress_count = len(user_inprogress_tasks[user_id])
+        done_weight = task_done_count * task_weights['Done']
+        inprogress_weight = task_inprogress_count * task_weights['In progress']
+        total_weight = done_weight + inprogress_weight
+        done_percentage = done_weight / total_weight if total_weight > 0 else 0
+        num_done = int(done_percentage * 5)
+        task_symbols = '🟩' * num_done + '🟨' * (5 - num_done)
+        table_data.append([user_id, members_by_id[user_id]['name'], task_symbols,
+                           task_done_count, task_inprogress_count, task_count])
+    return table_data
+
+
+def legacy_project_stats(responses):
+    # Прежняя реализация из stat_by_projects.stat_by_projects
+    project_task_count = {}
+    project_task_done_count = {}
+    project_task_blocked_count = {}
+    for task_detail in responses:
+        if "error" not in task_detail:
+            project_name = task_detail.get("project", {}).get("name", "Unknown")
+            plan_status = task_detail.get("plan_status", {}).get("name")
+            if project_name not in project_task_count:
+                project_task_count[project_name] = 0
+                project_task_done_count[project_name] = 0
+                project_task_blocked_count[project_name] = 0
+            project_task_count[project_name] += 1
+            if plan_status == "Done":
+                project_task_done_count[project_name] += 1
+            elif plan_status == "Blocked":
+                project_task_blocked_count[project_name] += 1
+
+    sorted_projects = sorted(project_task_count.items(), key=lambda item: (item[0] == "Unknown", -item[1]))
+    project_data = []
+    for project_name, task_count in sorted_projects:
+        task_done_count = project_task_done_count[project_name]
+        task_blocked_count = project_task_blocked_count[project_name]
+        percent_done = task_done_count / task_count
+        percent_blocked = task_blocked_count / task_count
+        percent_remaining = 1 - percent_done - percent_blocked
+        adjusted_percent_done = percent_done * 0.8
+        adjusted_percent_blocked = percent_blocked * 1
+        adjusted_percent_remaining = percent_remaining * 1.2
+        total_adjusted_percent = adjusted_percent_done + adjusted_percent_blocked + adjusted_percent_remaining
+        num_done = round((adjusted_percent_done / total_adjusted_percent) * 10)
+        num_blocked = round((adjusted_percent_blocked / total_adjusted_percent) * 10)
+        num_remaining = 10 - num_done - num_blocked
+        task_symbols = '🟩' * num_done + '🟥' * num_blocked + '🟨' * num_remaining
+        project_data.append([project_name, task_symbols, task_done_count, task_blocked_count, task_count])
+    return project_data
+
+
+def best_of(func, repeat=3):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run(num_tasks):
+    details, members_by_id, members_by_membership_id = make_dataset(num_tasks)
+
+    def legacy():
+        return (legacy_user_stats(details, members_by_id, members_by_membership_id),
+                legacy_project_stats(details))
+
+    # Строки, которые TaskStore.report_rows отдаёт после синхронизации
+    rows = [(detail["id"], *report_values(detail)) for detail in details]
+
+    def aggregate(frame):
+        return (user_stats(frame, members_by_id, members_by_membership_id),
+                project_stats(frame))
+
+    legacy_time, legacy_result = best_of(legacy)
+    details_time, details_result = best_of(lambda: aggregate(build_task_frame(details)))
+    rows_time, rows_result = best_of(lambda: aggregate(task_frame_from_rows(rows)))
+    frame = task_frame_from_rows(rows)
+    aggregation_time, _ = best_of(lambda: aggregate(frame))
+
+    assert legacy_result == details_result == rows_result, "pandas и циклы дали разные результаты"
+    # Таблица задач перестраивается только после синхронизации, изменившей задачи,
+    # в остальное время отчёт стоит столько, сколько агрегация по готовой таблице
+    print(f"{num_tasks:>7} задач | циклы: {legacy_time * 1000:7.1f} мс | pandas со сборкой: "
+          f"из деталей {details_time * 1000:7.1f} мс (x{legacy_time / details_time:.1f}), "
+          f"из строк хранилища {rows_time * 1000:7.1f} мс (x{legacy_time / rows_time:.1f}) | "
+          f"по готовой таблице {aggregation_time * 1000:.1f} мс (x{legacy_time / aggregation_time:.1f})")
+
+if __name__ == '__main__':
+    logging.disable(logging.DEBUG)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
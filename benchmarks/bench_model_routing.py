@@ -0,0 +1,69 @@
+"""
+Бенчмарк маршрутизации моделей GPT на локальной заглушке API.
+
+Прогоняет набор вопросов через ModelRouter и потоковый клиент бота
+и сравнивает задержку с вариантом «всегда основная модель».
+
+Запуск: python -m benchmarks.bench_model_routing
+"""
+import os
+import time
+import asyncio
+import logging
+
+PORT = 8089
+# Клиент OpenAI создаётся при импорте gpt_handler, поэтому адрес заглушки задаём до импорта
+os.environ['OPENAI_BASE_URL'] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault('openai_api_key', 'test')
+
+from benchmarks import mock_openai
+from telegram_bot.ai_tools.context_window import ChatContext
+from telegram_bot.ai_tools.model_router import ModelRouter, ModelStats, format_model_stats
+from telegram_bot.ai_tools.gpt_handler import stream_chatgpt_response, SYSTEM_PROMPT
+
+QUESTIONS = [
+    "Как скрыть категорию на виде в Revit?",
+    "Что такое LOD 300?",
+    "Горячая клавиша для выравнивания?",
+    "Как экспортировать модель в IFC 4 с сохранением общих параметров, "
+    "если часть семейств загружена из связанных файлов, а классификатор задан через "
+    "параметры проекта, и при этом нужно, чтобы GUID элементов не менялись между выгрузками? "
+    "Опиши настройки экспорта, типичные ошибки и как проверить результат в Solibri.",
+    "Почему этот скрипт Dynamo падает?\n```python\nfor el in IN[0]:\n    el.Parameter['Mark'].Set(1)\n```",
+    "Как создать спецификацию дверей?",
+]
+
+
+async def run(router, stats):
+    started = time.monotonic()
+    for question in QUESTIONS:
+        conversation = ChatContext(SYSTEM_PROMPT)
+        conversation.add("user", question)
+        model, reason = router.route(conversation)
+        usage = {}
+        request_started = time.monotonic()
+        first_token = None
+        async for _ in stream_chatgpt_response([conversation.system] + conversation.messages(), model, usage):
+            if first_token is None:
+                first_token = time.monotonic() - request_started
+        stats.record(model, first_token, time.monotonic() - request_started,
+                     usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), reason)
+    return time.monotonic() - started
+
+
+async def main():
+    runner = await mock_openai.start(PORT)
+    try:
+        for title, router in (("Маршрутизация", ModelRouter()),
+                              ("Всегда основная модель", ModelRouter(fast=ModelRouter().tiers['deep']))):
+            stats = ModelStats()
+            elapsed = await run(router, stats)
+            print(f"\n{title}: {len(QUESTIONS)} вопросов за {elapsed:.2f} с")
+            print(format_model_stats(stats.stats()))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Локальная заглушка OpenAI chat completions для проверки бота без реального API.
+
+Отвечает потоково (SSE) и обычным JSON, отдаёт usage при stream_options.include_usage.
+Задержка зависит от модели: быстрые модели (в имени mini) отвечают быстрее.
+
+Запуск: python -m benchmarks.mock_openai [порт]
+Бот: OPENAI_BASE_URL=http://127.0.0.1:8089/v1 openai_api_key=test python bot.py
+"""
+import sys
+import json
+import time
+import asyncio
+
+from aiohttp import web
+
+# Задержка до первого токена и на каждый токен ответа, в секундах
+PROFILES = {
+    'fast': (0.15, 0.004),
+    'deep': (0.6, 0.015),
+}
+
+
+def profile(model):
+    return PROFILES['fast'] if 'mini' in model else PROFILES['deep']
+
+
+def answer_for(messages):
+    question = messages[-1]['content']
+    # Длина ответа растёт с длиной вопроса, как у настоящей модели
+    words = max(20, min(400, len(question.split()) * 8))
+    return " ".join(f"слово{i}" for i in range(words))
+
+
+def _chunk(model, delta=None, finish_reason=None, usage=None):
+    choices = [] if delta is None and finish_reason is None else [
+        {"index": 0, "delta": {"content": delta} if delta else {}, "finish_reason": finish_reason}]
+    return {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": choices, "usage": usage}
+
+
+async def completions(request):
+    body = await request.json()
+    model = body['model']
+    first_token, per_token = profile(model)
+    text = answer_for(body['messages'])
+    tokens = text.split(' ')
+    usage = {
+        "prompt_tokens": sum(len(message['content']) // 4 + 4 for message in body['messages']),
+        "completion_tokens": len(tokens),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+    await asyncio.sleep(first_token)
+    if not body.get('stream'):
+        await asyncio.sleep(per_token * len(tokens))
+        return web.json_response({
+            "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+    await response.prepare(request)
+    for i, token in enumerate(tokens):
+        delta = token if i == 0 else f" {token}"
+        await response.write(f"data: {json.dumps(_chunk(model, delta))}\n\n".encode())
+        await asyncio.sleep(per_token)
+    await response.write(f"data: {json.dumps(_chunk(model, finish_reason='stop'))}\n\n".encode())
+    if (body.get('stream_options') or {}).get('include_usage'):
+        await response.write(f"data: {json.dumps(_chunk(model, usage=usage))}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    return response
+
+
+def make_app():
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', completions)
+    return app
+
+
+async def start(port=8089):
+    """Запускает заглушку в текущем цикле событий; возвращает runner для остановки."""
+    runner = web.AppRunner(make_app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+if __name__ == '__main__':
+    web.run_app(make_app(), host='127.0.0.1', port=int(sys.argv[1]) if len(sys.argv) > 1 else 8089)
@@ -2,9 +2,54 @@
 from telegram.ext import ApplicationBuilder
 from telegram_bot.config import TOKEN
 from telegram_bot.handlers import register_handlers
+from telegram_bot.http_client import http_client
+from telegram_bot.chart_pool import chart_renderer
+from telegram_bot.toggl.task_store import task_store
+from telegram_bot.toggl.http_cache import response_cache
+from telegram_bot.toggl.reports import schedule_report_jobs
+from telegram_bot.toggl.token_manager import schedule_token_refresh
+from telegram_bot.server.metrics import schedule_metrics_sampler
+from telegram_bot.server.metrics_store import metrics_store
+from telegram_bot.server.containers import container_stats
+from telegram_bot.ai_tools.session_store import session_store, schedule_session_flush
+from telegram_bot.ai_tools.gpt_handler import schedule_session_sweeper
+from telegram_bot.ai_tools.prompt_cache import prompt_cache
+
+
+async def post_init(app) -> None:
+    # Общая HTTP-сессия живёт всё время работы бота
+    await http_client.start()
+    # Токен Toggl обновляется заранее, до истечения срока
+    schedule_token_refresh(app.job_queue)
+    # Отчёты Toggl пересчитываются в фоне и отдаются из готовых снимков
+    schedule_report_jobs(app.job_queue)
+    # Метрики сервера собираются в фоне, /server отвечает сразу
+    schedule_metrics_sampler(app.job_queue)
+    # Сессии GPT пишутся на диск пачками, а не на каждом сообщении
+    schedule_session_flush(app.job_queue)
+    # Простаивающие сессии GPT завершаются одной периодической задачей
+    schedule_session_sweeper(app.job_queue)
+
+
+async def post_shutdown(app) -> None:
+    await http_client.close()
+    task_store.close()
+    response_cache.close()
+    chart_renderer.close()
+    metrics_store.close()
+    container_stats.close()
+    session_store.close()
+    prompt_cache.close()
+
 
 def main() -> None:
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     app.bot.delete_webhook(drop_pending_updates=True)
 
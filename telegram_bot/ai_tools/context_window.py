@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Бюджет токенов на запрос: системный промпт, сводка и последние реплики
+GPT_CONTEXT_TOKENS = int(os.getenv('GPT_CONTEXT_TOKENS', 6000))
+# После вытеснения контекст сжимается до этой доли бюджета, чтобы сводка не пересчитывалась на каждой реплике
+GPT_CONTEXT_TARGET = float(os.getenv('GPT_CONTEXT_TARGET', 0.75))
+# Вытесненные реплики сворачиваются в сводку (иначе просто отбрасываются)
+GPT_SUMMARIZE = os.getenv('GPT_SUMMARIZE', 'true').lower() in ('1', 'true', 'yes')
+
+# Служебные токены на каждое сообщение и на начало ответа (формат chat completions)
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+# Память на одну реплику помимо текста: кортеж (роль, текст, токены) и число
+TURN_OVERHEAD = sys.getsizeof(('', '', 0)) + sys.getsizeof(0)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Кодировка tiktoken, если он установлен; иначе None и грубая оценка по длине."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.info(f"tiktoken недоступен, токены оцениваются по длине текста: {e}")
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Около четырёх символов на токен для английского, для кириллицы меньше — берём с запасом
+    return len(text) // 3 + 1
+
+
+class ChatContext:
+    """
+    История диалога с ограничением по токенам.
+
+    Реплики хранятся компактно — кортежами (роль, текст, число токенов);
+    число токенов считается один раз при добавлении, словари для API
+    собираются только в prepare. Системный промпт закреплён; когда реплики перестают помещаться в бюджет,
+    самые старые вытесняются и сворачиваются в сводку, которая идёт сразу
+    после системного промпта.
+    """
+
+    def __init__(self, system_prompt, budget=GPT_CONTEXT_TOKENS, target=GPT_CONTEXT_TARGET):
+        self.system = {"role": "system", "content": system_prompt}
+        self.system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+        self.budget = budget
+        self.target = target
+        self.last_seen = time.time()
+        # Выбор модели для чата: auto, fast или deep
+        self.mode = 'auto'
+        # Сессия завершена и больше не сохраняется
+        self.closed = False
+        # Реплики в окне: (роль, текст, число токенов)
+        self.turns = []
+        self.summary = None
+        self.summary_text = None
+        self.summary_tokens = 0
+        # Вытесненные реплики, ещё не попавшие в сводку
+        self.evicted = []
+        # Сколько токенов занял бы полный диалог без обрезки
+        self.full_tokens = self.system_tokens
+        # Примерный объём в памяти: тексты реплик и сводки с накладными расходами
+        self.size = sys.getsizeof(system_prompt)
+
+    def add(self, role, content, tokens=None):
+        if tokens is None:
+            tokens = count_tokens(content) + MESSAGE_OVERHEAD
+        self.turns.append((sys.intern(role), content, tokens))
+        self.full_tokens += tokens
+        self.size += sys.getsizeof(content) + TURN_OVERHEAD
+
+    def window_tokens(self):
+        return (self.system_tokens + self.summary_tokens + REPLY_OVERHEAD
+                + sum(turn[2] for turn in self.turns))
+
+    def _evict(self):
+        """Вытесняет старые реплики до target бюджета; последняя реплика остаётся всегда."""
+        if self.window_tokens() <= self.budget:
+            return
+        limit = self.budget * self.target
+        total = self.window_tokens()
+        while len(self.turns) > 1 and total > limit:
+            role, content, tokens = self.turns.pop(0)
+            self.evicted.append({"role": role, "content": content})
+            self.size -= sys.getsizeof(content) + TURN_OVERHEAD
+            total -= tokens
+
+    def _set_summary(self, text):
+        if self.summary_text is not None:
+            self.size -= sys.getsizeof(self.summary_text)
+        self.summary_text = text
+        self.summary = {"role": "system", "content": f"Краткое содержание предыдущей части диалога:\n{text}"}
+        self.summary_tokens = count_tokens(self.summary["content"]) + MESSAGE_OVERHEAD
+        self.size += sys.getsizeof(text)
+
+    async def prepare(self, summarize=None):
+        """
+        Сообщения для запроса в пределах бюджета.
+
+        summarize(previous_summary, messages) -> str сворачивает вытесненные
+        реплики вместе с прежней сводкой; без неё реплики просто отбрасываются.
+        """
+        self._evict()
+        if self.evicted:
+            if summarize is not None and GPT_SUMMARIZE:
+                try:
+                    self._set_summary(await summarize(self.summary_text, self.evicted))
+                except Exception as e:
+                    logger.error(f"Не удалось обновить сводку диалога, старые реплики отброшены: {e}")
+            logger.info(f"Из контекста вытеснено реплик: {len(self.evicted)}")
+            self.evicted = []
+            # Сводка могла вырасти — проверяем бюджет ещё раз, уже без повторного сворачивания
+            self._evict()
+            self.evicted = []
+
+        messages = [self.system]
+        if self.summary:
+            messages.append(self.summary)
+        messages.extend(self.messages())
+        return messages
+
+    def messages(self):
+        return [{"role": role, "content": content} for role, content, _ in self.turns]
+
+    def to_state(self):
+        """Состояние для сохранения на диск (простые типы для JSON)."""
+        return {
+            "system": self.system["content"],
+            "summary": self.summary_text,
+            "turns": self.turns,
+            "full_tokens": self.full_tokens,
+            "last_seen": self.last_seen,
+            "mode": self.mode,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        context = cls(state["system"])
+        for role, content, tokens in state["turns"]:
+            context.add(role, content, tokens)
+        if state.get("summary"):
+            context._set_summary(state["summary"])
+        context.full_tokens = state.get("full_tokens", context.full_tokens)
+        context.last_seen = state.get("last_seen", context.last_seen)
+        context.mode = state.get("mode", context.mode)
+        return context
@@ -1,10 +1,19 @@
 import os
+import time
+import asyncio
 import logging
 from dotenv import load_dotenv
-from telegram import Update
-from telegram.ext import CallbackContext, CommandHandler, MessageHandler, filters, ConversationHandler, ApplicationBuilder, JobQueue
-from openai import OpenAI
-import time
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackContext, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ConversationHandler
+from openai import AsyncOpenAI
+
+from telegram_bot.live_message import LiveMessage
+from telegram_bot.handlers.security_check import is_user_whitelisted
+from telegram_bot.ai_tools.session_store import session_store, GPT_SESSION_SWEEP_INTERVAL
+from telegram_bot.ai_tools.scheduler import gpt_scheduler, QueuedRequest
+from telegram_bot.ai_tools.prompt_cache import prompt_cache, prompt_key
+from telegram_bot.ai_tools.context_window import count_tokens
+from telegram_bot.ai_tools.model_router import model_router, model_stats, format_model_stats, MODES, GPT_MODEL_FAST
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,50 +23,195 @@ logger = logging.getLogger(__name__)
 load_dotenv(dotenv_path='.env')
 api_key = os.getenv('openai_api_key')
 
-# Создание клиента OpenAI
-client = OpenAI(api_key=api_key)
+# Адрес API, совместимого с OpenAI (например, локальной заглушки для тестов)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+SYSTEM_PROMPT = "You are a helpful assistant."
+# Сводку вытесненной части диалога пишет быстрая модель
+GPT_SUMMARY_MODEL = os.getenv('GPT_SUMMARY_MODEL', GPT_MODEL_FAST)
+# Предел длины сводки вытесненной части диалога
+GPT_SUMMARY_TOKENS = int(os.getenv('GPT_SUMMARY_TOKENS', 300))
+# Минимальный интервал (в секундах) между правками сообщения с ответом
+GPT_EDIT_INTERVAL = float(os.getenv('GPT_EDIT_INTERVAL', 1.0))
+# Ограничение Telegram на длину одного сообщения
+MESSAGE_LIMIT = 4096
+
+# Создание асинхронного клиента OpenAI
+client = AsyncOpenAI(api_key=api_key, base_url=OPENAI_BASE_URL)
+
+
+def stop_button(key):
+    # Ключ запроса в кнопке: остановить можно только свой ответ, на любой его странице
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⏹ Остановить", callback_data=f'gpt_stop:{key}')]])
 
-# Словарь для хранения истории сообщений по чатам
-chat_histories = {}
-last_interaction_times = {}
 
 # Определение состояния для диалога
 ASKING = 1
 
-# Функция для получения ответа от ChatGPT с учетом истории
-def fetch_chatgpt_response(messages):
-    response = client.chat.completions.create(
-        model="gpt-4-turbo",
-        messages=messages
+# Потоковый ответ ChatGPT с учетом истории: фрагменты текста по мере генерации.
+# Если передан словарь usage, в него записывается расход токенов из последнего фрагмента.
+async def stream_chatgpt_response(messages, model, usage=None):
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    try:
+        async for chunk in stream:
+            if usage is not None and chunk.usage is not None:
+                usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                usage["completion_tokens"] = chunk.usage.completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+async def summarize_turns(previous_summary, messages):
+    """Сворачивает вытесненные из контекста реплики вместе с прежней сводкой."""
+    dialogue = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    if previous_summary:
+        dialogue = f"{previous_summary}\n\n{dialogue}"
+    response = await client.chat.completions.create(
+        model=GPT_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "Summarize the conversation below in a few sentences. "
+                                          "Keep facts, names, numbers and decisions the user may refer to later. "
+                                          "Answer in the language of the conversation."},
+            {"role": "user", "content": dialogue},
+        ],
+        max_tokens=GPT_SUMMARY_TOKENS
     )
     return response.choices[0].message.content.strip()
 
-# Функция для завершения сессии по таймеру
-async def timeout(context: CallbackContext):
-    job = context.job
-    chat_id = job.data['chat_id']
 
-    if chat_id in last_interaction_times:
-        elapsed_time = time.time() - last_interaction_times[chat_id]
-        logger.info(f"Прошло времени с последнего взаимодействия для чата {chat_id}: {elapsed_time:.2f} секунд")
+async def _replay(answer):
+    # Ответ из кэша проходит тот же путь, что и потоковый: разбивка на сообщения и разметка
+    yield answer
+
+
+def _split_point(text, limit=MESSAGE_LIMIT):
+    """Где разрезать слишком длинный ответ: по последнему переносу строки до лимита."""
+    cut = text.rfind('\n', 0, limit)
+    return cut if cut > limit // 2 else limit
+
+
+async def generate_reply(live, conversation):
+    """
+    Генерирует ответ в уже отправленное сообщение live и показывает его сразу:
+    сообщение правится на месте по мере прихода токенов, не чаще
+    GPT_EDIT_INTERVAL. Длинный ответ продолжается в новом сообщении.
+    Кнопка «Остановить» отменяет задачу, уже полученная часть ответа
+    остаётся в истории.
+    """
+    live.update("✍️ ...")
+    history = await conversation.prepare(summarize_turns)
+    model, reason = model_router.route(conversation, conversation.mode)
+    prompt_tokens = conversation.window_tokens()
+    key = prompt_key(model, history) if prompt_cache.enabled else None
+    cached = prompt_cache.get(key, prompt_tokens)
+    usage = {}
+    if cached is not None:
+        logger.info(f"Ответ из кэша: {len(history)} сообщений, ~{prompt_tokens} токенов не отправлено")
+        deltas = _replay(cached)
+    else:
+        logger.info(f"Запрос к {model} ({reason}): {len(history)} сообщений, "
+                    f"~{prompt_tokens} токенов (полная история ~{conversation.full_tokens})")
+        deltas = stream_chatgpt_response(history, model, usage)
+    response = ""
+    page_start = 0
+    stopped = False
+    started_at = time.monotonic()
+    first_token = None
+    try:
+        async for delta in deltas:
+            if first_token is None:
+                first_token = time.monotonic() - started_at
+            response += delta
+            page = response[page_start:]
+            if len(page) > MESSAGE_LIMIT - 2:
+                cut = _split_point(page, MESSAGE_LIMIT - 2)
+                await live.finish(page[:cut], parse_mode='Markdown', reply_markup=None)
+                page_start += cut + (page[cut:cut + 1] == '\n')
+                live = LiveMessage(live.message, GPT_EDIT_INTERVAL, reply_markup=live.reply_markup)
+                await live.start(response[page_start:].strip() or "✍️ ...")
+                continue
+            live.update(page + " ▌")
+    except asyncio.CancelledError:
+        stopped = True
+    except Exception as e:
+        logger.error(f"Ошибка запроса к OpenAI ({model}): {e}")
+        model_stats.record_error(model)
+        await live.finish(f"{response[page_start:]}\n\n⚠️ Ошибка генерации ответа.".strip(), reply_markup=None)
+        return response
+    finally:
+        if response:
+            conversation.add("assistant", response)
+
+    if stopped:
+        # Оборванный ответ исказил бы задержку и расход токенов — считаем его отдельно
+        if cached is None:
+            model_stats.record_stop(model)
+    elif cached is None:
+        # Без usage от API (например, у заглушки) берём свою оценку
+        model_stats.record(model, first_token, time.monotonic() - started_at,
+                           usage.get("prompt_tokens", prompt_tokens),
+                           usage.get("completion_tokens", count_tokens(response)), reason)
 
-        if elapsed_time > 300:  # 300 секунд
-            logger.info(f"Таймер завершает сессию для чата {chat_id}")
-            await cancel(None, context, chat_id)
+    text = response[page_start:].strip() or "Пустой ответ."
+    if stopped:
+        await live.finish(f"{text}\n\n⏹ Остановлено.", reply_markup=None)
+        return response
+    if cached is None:
+        # В кэш попадают только полные ответы
+        prompt_cache.put(key, response)
+    else:
+        text += "\n\n⚡ Ответ из кэша"
+    await live.finish(text, parse_mode='Markdown', reply_markup=None)
+    return response
+
+
+# Периодическая задача: завершает все простаивающие сессии разом
+async def sweep_idle_sessions(context: CallbackContext):
+    for chat_id in session_store.pop_idle():
+        conversation = session_store.get(chat_id)
+        if gpt_scheduler.is_busy(chat_id) and conversation is not None:
+            # Ответ ещё генерируется или ждёт очереди — сессия не простаивает
+            session_store.updated(chat_id, conversation)
+            continue
+        logger.info(f"Сессия чата {chat_id} завершается по неактивности")
+        await cancel(None, context, chat_id)
+
+
+def schedule_session_sweeper(job_queue):
+    job_queue.run_repeating(sweep_idle_sessions, interval=GPT_SESSION_SWEEP_INTERVAL,
+                            first=GPT_SESSION_SWEEP_INTERVAL, name='gpt_session_sweeper')
 
 # Хэндлер для команды /gpt
 async def start_gpt(update: Update, context: CallbackContext):
     chat_id = update.message.chat_id
 
-    if chat_id not in chat_histories:
-        chat_histories[chat_id] = [{"role": "system", "content": "You are a helpful assistant."}]
-    last_interaction_times[chat_id] = time.time()
+    mode = context.args[0].lower() if context.args else None
+    if mode is not None and mode not in MODES:
+        await update.message.reply_text("Использование: /gpt [fast|deep|auto]")
+        return ConversationHandler.END if session_store.get(chat_id) is None else ASKING
 
-    # Установка таймера на завершение сессии через 300 секунд
-    context.job_queue.run_once(timeout, 300, data={'chat_id': chat_id})
+    conversation = session_store.get(chat_id)
+    if conversation is None:
+        conversation = session_store.create(chat_id, SYSTEM_PROMPT)
+        text = "Напишите ваш вопрос помощнику."
+    else:
+        # Сессия пережила перезапуск бота или /gpt вызван повторно
+        text = "Продолжаем диалог. Напишите ваш вопрос помощнику."
+    if mode is not None:
+        # Выбор модели сохраняется в сессии до её завершения
+        conversation.mode = mode
+        labels = {'auto': "выбирается по вопросу", 'fast': model_router.tiers['fast'],
+                  'deep': model_router.tiers['deep']}
+        text = f"Модель: {labels[mode]}.\n{text}"
+    session_store.updated(chat_id, conversation)
 
-    await context.bot.send_message(chat_id=chat_id, text="Напишите ваш вопрос помощнику.")
-    logger.info(f"Таймер установлен для чата {chat_id}")
+    await context.bot.send_message(chat_id=chat_id, text=text)
     return ASKING
 
 # Хэндлер для обработки сообщений пользователя
@@ -65,58 +219,111 @@ async def handle_message(update: Update, context: CallbackContext):
     chat_id = update.message.chat_id
 
     # Проверка, активна ли сессия
-    if chat_id not in chat_histories:
+    conversation = session_store.get(chat_id)
+    if conversation is None:
         await context.bot.send_message(chat_id=chat_id, text="Сессия была завершена. Начните новую.")
         return ConversationHandler.END
 
     user_input = update.message.text
-    last_interaction_times[chat_id] = time.time()
-
-    # Сброс таймера
-    current_jobs = context.job_queue.get_jobs_by_name(f'timeout_{chat_id}')
-    for job in current_jobs:
-        job.schedule_removal()
-    context.job_queue.run_once(timeout, 300, data={'chat_id': chat_id}, name=f'timeout_{chat_id}')
-
-    logger.info(f"Таймер сброшен для чата {chat_id}")
+    session_store.updated(chat_id, conversation)
 
     # Проверка на команду завершения сессии
     if user_input.lower() == 'пока':
         return await cancel(update, context)
 
-    # Добавление вопроса пользователя в историю
-    chat_histories[chat_id].append({"role": "user", "content": user_input})
+    # Вопросы чата обрабатываются строго по очереди, между чатами — параллельно
+    key = update.message.message_id
+    live = LiveMessage(update.message, GPT_EDIT_INTERVAL, reply_markup=stop_button(key))
+    shown = asyncio.Event()
+
+    async def run():
+        # Запрос может дойти до выполнения раньше, чем Telegram примет заглушку
+        await shown.wait()
+        if live.sent is not None:
+            await _run_generation(chat_id, live, user_input)
 
-    # Получение ответа от ChatGPT
-    response = fetch_chatgpt_response(chat_histories[chat_id])
+    async def on_drop():
+        await shown.wait()
+        if live.sent is not None:
+            await live.finish("⏹ Остановлено.", reply_markup=None)
 
-    # Отправка ответа пользователю
-    await context.bot.send_message(chat_id=chat_id, text=response, parse_mode='Markdown')
+    position = gpt_scheduler.submit(chat_id, QueuedRequest(key, run, on_drop))
+    if position is None:
+        await update.message.reply_text("⏳ Слишком много вопросов в очереди, дождитесь ответов.")
+        return ASKING
+    try:
+        await live.start("✍️ ..." if position == 0 else f"⏳ Вы №{position} в очереди")
+    finally:
+        # Если заглушку отправить не удалось, запрос завершится сразу и освободит место
+        shown.set()
+
+    return ASKING
 
-    # Добавление ответа ChatGPT в историю
-    chat_histories[chat_id].append({"role": "assistant", "content": response})
 
-    # Логирование истории сообщений
+async def _run_generation(chat_id, live, user_input):
+    conversation = session_store.get(chat_id)
+    if conversation is None:
+        await live.finish("Сессия была завершена. Начните новую.", reply_markup=None)
+        return
+    # Вопрос попадает в историю, только когда до него дошла очередь
+    conversation.add("user", user_input)
+    await generate_reply(live, conversation)
+    session_store.updated(chat_id, conversation)
     log_message_history(chat_id)
 
-    return ASKING
+
+# Хэндлер кнопки «Остановить»
+async def stop_generation(update: Update, context: CallbackContext):
+    query = update.callback_query
+    key = query.data.partition(':')[2]
+    if key.isdigit() and gpt_scheduler.cancel(query.message.chat_id, int(key)):
+        await query.answer("Остановлено")
+    else:
+        await query.answer("Ответ уже готов")
 
 # Хэндлер для команды выхода
 async def cancel(update: Update, context: CallbackContext, chat_id=None):
     if update:
         chat_id = update.message.chat_id
     if chat_id is not None:
-        chat_histories.pop(chat_id, None)
-        last_interaction_times.pop(chat_id, None)
+        gpt_scheduler.cancel_chat(chat_id)
+        session_store.delete(chat_id)
         await context.bot.send_message(chat_id=chat_id, text="Сессия завершена.")
         logger.info(f"Сессия завершена для чата {chat_id}")
     return ConversationHandler.END
 
 def log_message_history(chat_id):
     logger.info(f"История сообщений для чата {chat_id}:")
-    for message in chat_histories[chat_id]:
+    conversation = session_store.get(chat_id)
+    for message in conversation.messages() if conversation else []:
         logger.info(f"{message['role']}: {message['content']}")
 
+
+# Хэндлер для команды /gpt_stats
+async def gpt_stats(update: Update, context: CallbackContext):
+    if not is_user_whitelisted(update.effective_user.id):
+        await update.message.reply_text('Отказано в доступе.')
+        return
+    stats = session_store.stats()
+    await update.message.reply_text(
+        f"🧠 Сессии GPT\n"
+        f"В памяти: {stats['sessions']}, {stats['bytes'] / 1024 / 1024:.2f} из "
+        f"{stats['max_bytes'] / 1024 / 1024:.0f} MB\n"
+        f"Вытеснено из памяти: {stats['evictions']}, подгружено с диска: {stats['loads']}\n"
+        f"На диске: {stats['persisted']}, ждут записи: {stats['pending']}")
+    queue = gpt_scheduler.stats()
+    await update.message.reply_text(
+        f"🚦 Запросы GPT\n"
+        f"Выполняются: {queue['running']} из {queue['max_concurrent']}, в очереди: {queue['queued']}\n"
+        f"Всего запущено: {queue['started']}, отклонено (очередь полна): {queue['rejected']}")
+    await update.message.reply_text(format_model_stats(model_stats.stats()))
+    cache = prompt_cache.stats()
+    if cache['enabled']:
+        await update.message.reply_text(
+            f"⚡ Кэш ответов: {cache['entries']} записей\n"
+            f"Попаданий: {cache['hits']} из {cache['lookups']} ({cache['hit_rate']:.0%})\n"
+            f"Сэкономлено токенов: ~{cache['saved_tokens']}, вытеснено: {cache['evictions']}")
+
 # Создание обработчика диалога
 gpt_conversation_handler = ConversationHandler(
     entry_points=[CommandHandler('gpt', start_gpt)],
@@ -125,4 +332,7 @@ gpt_conversation_handler = ConversationHandler(
     },
     fallbacks=[CommandHandler('cancel', cancel)],
     allow_reentry=True
-)
\ No newline at end of file
+)
+
+# Кнопка «Остановить» работает и вне состояния диалога
+gpt_stop_handler = CallbackQueryHandler(stop_generation, pattern='^gpt_stop')
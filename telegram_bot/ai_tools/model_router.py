@@ -0,0 +1,131 @@
+import os
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Уровни моделей: быстрая для коротких вопросов и основная для сложных
+GPT_MODEL_FAST = os.getenv('GPT_MODEL_FAST', 'gpt-4o-mini')
+GPT_MODEL_DEEP = os.getenv('GPT_MODEL_DEEP', os.getenv('GPT_MODEL', 'gpt-4-turbo'))
+# Пороги маршрутизации: выше любого из них вопрос уходит основной модели
+GPT_ROUTE_QUESTION_TOKENS = int(os.getenv('GPT_ROUTE_QUESTION_TOKENS', 80))
+GPT_ROUTE_MAX_TURNS = int(os.getenv('GPT_ROUTE_MAX_TURNS', 6))
+GPT_ROUTE_CONTEXT_TOKENS = int(os.getenv('GPT_ROUTE_CONTEXT_TOKENS', 2000))
+# Сколько последних запросов каждой модели учитывать в процентилях задержки
+GPT_ROUTE_STATS_WINDOW = int(os.getenv('GPT_ROUTE_STATS_WINDOW', 200))
+
+MODES = ('auto', 'fast', 'deep')
+
+
+class ModelRouter:
+    """
+    Выбор модели на каждый запрос.
+
+    Режим чата fast/deep (команды /gpt fast, /gpt deep) задаёт модель явно;
+    в режиме auto короткий вопрос в начале диалога уходит быстрой модели,
+    а длинный вопрос, код, долгий диалог или большой контекст — основной.
+    """
+
+    def __init__(self, fast=GPT_MODEL_FAST, deep=GPT_MODEL_DEEP,
+                 question_tokens=GPT_ROUTE_QUESTION_TOKENS, max_turns=GPT_ROUTE_MAX_TURNS,
+                 context_tokens=GPT_ROUTE_CONTEXT_TOKENS):
+        self.tiers = {'fast': fast, 'deep': deep}
+        self.question_tokens = question_tokens
+        self.max_turns = max_turns
+        self.context_tokens = context_tokens
+
+    def route(self, conversation, mode='auto'):
+        """Возвращает (модель, причина выбора)."""
+        if mode in self.tiers:
+            return self.tiers[mode], f"режим {mode}"
+        role, question, tokens = conversation.turns[-1]
+        if tokens > self.question_tokens:
+            return self.tiers['deep'], f"длинный вопрос (~{tokens} токенов)"
+        if '```' in question:
+            return self.tiers['deep'], "вопрос с кодом"
+        if conversation.summary is not None or len(conversation.turns) > self.max_turns:
+            return self.tiers['deep'], "долгий диалог"
+        if conversation.window_tokens() > self.context_tokens:
+            return self.tiers['deep'], f"большой контекст (~{conversation.window_tokens()} токенов)"
+        return self.tiers['fast'], "короткий вопрос"
+
+
+class ModelStats:
+    """Задержка и расход токенов по моделям для настройки порогов маршрутизации."""
+
+    def __init__(self, window=GPT_ROUTE_STATS_WINDOW):
+        self.window = window
+        self._models = {}
+
+    def _entry(self, model):
+        if model not in self._models:
+            self._models[model] = {
+                "requests": 0, "errors": 0, "stopped": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "first_token": deque(maxlen=self.window), "total": deque(maxlen=self.window),
+            }
+        return self._models[model]
+
+    def record(self, model, first_token, total, prompt_tokens, completion_tokens, reason=""):
+        entry = self._entry(model)
+        entry["requests"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        if first_token is not None:
+            entry["first_token"].append(first_token)
+        entry["total"].append(total)
+        # Строка для разбора логов при подборе порогов
+        first = f"{first_token:.2f} с" if first_token is not None else "—"
+        logger.info(f"GPT {model} ({reason}): первый токен {first}, всего {total:.2f} с, "
+                    f"токенов {prompt_tokens} + {completion_tokens}")
+
+    def record_error(self, model):
+        self._entry(model)["errors"] += 1
+
+    def record_stop(self, model):
+        """Ответ остановлен пользователем: в задержку и токены не входит."""
+        self._entry(model)["stopped"] += 1
+
+    @staticmethod
+    def _percentile(values, q):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self):
+        result = {}
+        for model, entry in self._models.items():
+            result[model] = {
+                "requests": entry["requests"],
+                "errors": entry["errors"],
+                "stopped": entry["stopped"],
+                "prompt_tokens": entry["prompt_tokens"],
+                "completion_tokens": entry["completion_tokens"],
+                "first_token_p50": self._percentile(entry["first_token"], 0.5),
+                "total_p50": self._percentile(entry["total"], 0.5),
+                "total_p95": self._percentile(entry["total"], 0.95),
+            }
+        return result
+
+
+def format_model_stats(stats):
+    if not stats:
+        return "📊 Запросов к моделям ещё не было"
+    lines = ["📊 Модели:"]
+    for model, entry in sorted(stats.items()):
+        if entry["total_p50"] is None:
+            lines.append(f"• {model}: ошибок {entry['errors']}, остановлено {entry['stopped']}")
+            continue
+        first_token = f"{entry['first_token_p50']:.2f}" if entry["first_token_p50"] is not None else "—"
+        lines.append(
+            f"• {model}: {entry['requests']} запросов, ошибок {entry['errors']}, "
+            f"остановлено {entry['stopped']}\n"
+            f"  первый токен p50 {first_token} с, ответ p50 {entry['total_p50']:.2f} с / "
+            f"p95 {entry['total_p95']:.2f} с\n"
+            f"  токенов: {entry['prompt_tokens']} запрос + {entry['completion_tokens']} ответ")
+    return "\n".join(lines)
+
+
+# Общий маршрутизатор и статистика моделей
+model_router = ModelRouter()
+model_stats = ModelStats()
@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import unicodedata
+
+from telegram_bot.ai_tools.context_window import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Кэш ответов GPT включается явно
+GPT_CACHE_ENABLED = os.getenv('GPT_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+GPT_CACHE_PATH = os.getenv('GPT_CACHE_PATH', 'data/gpt_cache.sqlite3')
+GPT_CACHE_TTL = float(os.getenv('GPT_CACHE_TTL', 7 * 24 * 60 * 60))
+GPT_CACHE_MAX_ENTRIES = int(os.getenv('GPT_CACHE_MAX_ENTRIES', 2000))
+# Сколько предыдущих реплик входит в ключ вместе с вопросом
+GPT_CACHE_CONTEXT_TURNS = int(os.getenv('GPT_CACHE_CONTEXT_TURNS', 2))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_accessed_at ON answers (accessed_at);
+"""
+
+
+def normalize(text):
+    """Регистр, пробелы, типографика и финальная пунктуация не влияют на ключ."""
+    text = unicodedata.normalize('NFKC', text).lower().replace('ё', 'е')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?!.…')
+
+
+def prompt_key(model, messages, context_turns=GPT_CACHE_CONTEXT_TURNS):
+    """
+    Ключ запроса: модель, системные сообщения (промпт и сводка), последние
+    context_turns реплик и сам вопрос — всё после нормализации.
+    """
+    system = [message['content'] for message in messages if message['role'] == 'system']
+    turns = [message for message in messages if message['role'] != 'system']
+    if not turns or turns[-1]['role'] != 'user':
+        return None
+    recent = turns[-1 - context_turns:-1] if context_turns else []
+    parts = [model, [normalize(text) for text in system],
+             [(message['role'], normalize(message['content'])) for message in recent],
+             normalize(turns[-1]['content'])]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+class PromptCache:
+    """
+    Готовые ответы модели на повторяющиеся вопросы в SQLite на диске.
+
+    Записи живут ttl секунд; когда их больше max_entries, вытесняются
+    давно не использованные (LRU). Считает попадания и сэкономленные
+    токены (запрос и ответ, которые не пришлось оплачивать).
+    """
+
+    def __init__(self, path=GPT_CACHE_PATH, ttl=GPT_CACHE_TTL, max_entries=GPT_CACHE_MAX_ENTRIES,
+                 enabled=GPT_CACHE_ENABLED):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.lookups = 0
+        self.hits = 0
+        self.saved_tokens = 0
+        self.evictions = 0
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def get(self, key, prompt_tokens=0):
+        """Ответ из кэша или None; prompt_tokens — размер запроса для учёта экономии."""
+        if not self.enabled or key is None:
+            return None
+        self.lookups += 1
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT answer, tokens FROM answers WHERE key = ? AND created_at >= ?",
+            (key, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        answer, tokens = row
+        with self.conn:
+            self.conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        self.saved_tokens += prompt_tokens + tokens
+        return answer
+
+    def put(self, key, answer):
+        if not self.enabled or key is None or not answer:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, tokens, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (key, answer, count_tokens(answer), now, now))
+            expired = self.conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,)).rowcount
+            overflow = self.conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+        self.evictions += expired + overflow
+
+    def stats(self):
+        entries = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] if self.enabled else 0
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+            "evictions": self.evictions,
+        }
+
+
+# Общий кэш ответов GPT
+prompt_cache = PromptCache()
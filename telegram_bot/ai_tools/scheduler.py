@@ -0,0 +1,173 @@
+import os
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Сколько запросов к OpenAI выполняется одновременно по всем чатам
+GPT_MAX_CONCURRENT = int(os.getenv('GPT_MAX_CONCURRENT', 4))
+# Сколько вопросов одного чата может ждать в очереди
+GPT_CHAT_QUEUE_LIMIT = int(os.getenv('GPT_CHAT_QUEUE_LIMIT', 5))
+
+
+class QueuedRequest:
+    """Запрос в очереди: key — идентификатор для отмены, run — фабрика корутины."""
+
+    def __init__(self, key, run, on_drop=None):
+        self.key = key
+        self.run = run
+        self.on_drop = on_drop
+
+
+class RequestScheduler:
+    """
+    Очередь запросов к модели: по порядку внутри чата, параллельно между чатами.
+
+    У каждого чата своя FIFO-очередь и не больше одного выполняемого запроса,
+    поэтому реплики попадают в историю в порядке отправки. Всего одновременно
+    выполняется не больше max_concurrent запросов; чаты с ожидающими
+    запросами обслуживаются по кругу — после своего запроса чат встаёт
+    в конец круга, и один разговорчивый чат не задерживает остальные.
+    """
+
+    def __init__(self, max_concurrent=GPT_MAX_CONCURRENT, chat_queue_limit=GPT_CHAT_QUEUE_LIMIT):
+        self.max_concurrent = max_concurrent
+        self.chat_queue_limit = chat_queue_limit
+        self.started = 0
+        self.rejected = 0
+        # chat_id -> deque[QueuedRequest]
+        self._queues = {}
+        # Чаты с ожидающими запросами и без выполняемого, в порядке очереди
+        self._ready = deque()
+        # chat_id -> (QueuedRequest, asyncio.Task)
+        self._running = {}
+        # Задачи on_drop: ссылка нужна, чтобы задачу не собрал сборщик мусора до завершения
+        self._background = set()
+
+    def is_full(self, chat_id):
+        return len(self._queues.get(chat_id, ())) >= self.chat_queue_limit
+
+    def is_busy(self, chat_id):
+        return chat_id in self._running or chat_id in self._queues
+
+    def position(self, chat_id):
+        """
+        Место, которое займёт новый запрос чата: 0 — начнётся сразу,
+        иначе номер в общей очереди с учётом обхода чатов по кругу.
+        """
+        if not self.is_busy(chat_id) and len(self._running) < self.max_concurrent:
+            return 0
+        # Новый чат встаёт в круг сразу, а чаты с выполняемым запросом — только
+        # после его завершения, то есть позади всех уже ожидающих
+        ring = list(self._ready)
+        if chat_id not in self._ready and chat_id not in self._running:
+            ring.append(chat_id)
+        ring += [chat for chat in self._running if chat in self._queues or chat == chat_id]
+        remaining = {chat: len(self._queues.get(chat, ())) for chat in ring}
+        remaining[chat_id] += 1
+        ring = deque(ring)
+        position = 0
+        while ring:
+            chat = ring.popleft()
+            position += 1
+            remaining[chat] -= 1
+            if chat == chat_id and remaining[chat] == 0:
+                return position
+            if remaining[chat]:
+                ring.append(chat)
+        return position
+
+    def submit(self, chat_id, request):
+        """
+        Ставит запрос в очередь чата и возвращает его место, как position();
+        None, если очередь чата заполнена. Проверка и постановка — один шаг,
+        поэтому место не устаревает, пока вызывающий чего-то ждёт.
+        """
+        if self.is_full(chat_id):
+            self.rejected += 1
+            return None
+        position = self.position(chat_id)
+        self._queues.setdefault(chat_id, deque()).append(request)
+        if chat_id not in self._running and chat_id not in self._ready:
+            self._ready.append(chat_id)
+        self._dispatch()
+        return position
+
+    def _dispatch(self):
+        while self._ready and len(self._running) < self.max_concurrent:
+            chat_id = self._ready.popleft()
+            queue = self._queues[chat_id]
+            request = queue.popleft()
+            if not queue:
+                del self._queues[chat_id]
+            self.started += 1
+            task = asyncio.create_task(request.run())
+            # Колбэк, а не finally: он сработает, даже если задачу отменили до первого шага
+            task.add_done_callback(lambda task, chat_id=chat_id, request=request:
+                                   self._finished(chat_id, request, task))
+            self._running[chat_id] = (request, task)
+
+    def _finished(self, chat_id, request, task):
+        del self._running[chat_id]
+        if task.cancelled():
+            self._drop(request)
+        elif task.exception() is not None:
+            logger.error(f"Ошибка запроса к модели для чата {chat_id}: {task.exception()}",
+                         exc_info=task.exception())
+        if chat_id in self._queues:
+            self._ready.append(chat_id)
+        self._dispatch()
+
+    def _drop(self, request):
+        if request.on_drop is not None:
+            task = asyncio.create_task(request.on_drop())
+            self._background.add(task)
+            task.add_done_callback(self._dropped)
+
+    def _dropped(self, task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Ошибка при снятии запроса к модели: {task.exception()}",
+                         exc_info=task.exception())
+
+    def cancel(self, chat_id, key):
+        """Снимает ожидающий запрос с данным ключом или отменяет выполняемый, если ключ его."""
+        queue = self._queues.get(chat_id)
+        for request in queue or ():
+            if request.key == key:
+                queue.remove(request)
+                if not queue:
+                    del self._queues[chat_id]
+                    if chat_id in self._ready:
+                        self._ready.remove(chat_id)
+                self._drop(request)
+                return True
+        running = self._running.get(chat_id)
+        if running is not None and running[0].key == key:
+            running[1].cancel()
+            return True
+        return False
+
+    def cancel_chat(self, chat_id):
+        """Снимает все запросы чата: ожидающие удаляются, выполняемый отменяется."""
+        for request in self._queues.pop(chat_id, ()):
+            self._drop(request)
+        if chat_id in self._ready:
+            self._ready.remove(chat_id)
+        running = self._running.get(chat_id)
+        if running is not None:
+            running[1].cancel()
+
+    def stats(self):
+        return {
+            "running": len(self._running),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "max_concurrent": self.max_concurrent,
+            "started": self.started,
+            "rejected": self.rejected,
+        }
+
+
+# Общая очередь запросов GPT
+gpt_scheduler = RequestScheduler()
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import zlib
+import logging
+import sqlite3
+import weakref
+from collections import OrderedDict
+
+from telegram.ext import CallbackContext
+
+from telegram_bot.ai_tools.context_window import ChatContext
+
+logger = logging.getLogger(__name__)
+
+# Сессии GPT на диске и предел памяти под сессии в процессе
+GPT_SESSIONS_DB = os.getenv('GPT_SESSIONS_DB', 'data/gpt_sessions.sqlite3')
+GPT_SESSIONS_MAX_BYTES = int(os.getenv('GPT_SESSIONS_MAX_BYTES', 20 * 1024 * 1024))
+# Как часто изменённые сессии сбрасываются на диск (в секундах)
+GPT_SESSIONS_FLUSH_INTERVAL = float(os.getenv('GPT_SESSIONS_FLUSH_INTERVAL', 10))
+# Сессия завершается после стольких секунд без сообщений
+GPT_SESSION_TIMEOUT = float(os.getenv('GPT_SESSION_TIMEOUT', 300))
+# Как часто ищутся простаивающие сессии (в секундах)
+GPT_SESSION_SWEEP_INTERVAL = float(os.getenv('GPT_SESSION_SWEEP_INTERVAL', 30))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    chat_id INTEGER PRIMARY KEY,
+    last_seen REAL NOT NULL,
+    state BLOB NOT NULL
+);
+"""
+
+
+def pack(context):
+    return zlib.compress(json.dumps(context.to_state(), ensure_ascii=False).encode())
+
+
+def unpack(blob):
+    return ChatContext.from_state(json.loads(zlib.decompress(blob)))
+
+
+class SessionStore:
+    """
+    Сессии GPT по чатам: LRU в памяти с пределом по объёму и SQLite на диске.
+
+    Запись отложенная: изменённые сессии только помечаются и сбрасываются
+    на диск одной транзакцией раз в flush_interval, поэтому путь сообщения
+    не ждёт диска. При превышении max_bytes из памяти вытесняются давно
+    не активные чаты — с диска они подгружаются при следующем сообщении.
+    Сессии старше ttl считаются завершёнными.
+
+    Время последней активности живых сессий хранится отдельно в OrderedDict
+    в порядке обращений: отметка активности — перенос в конец за O(1),
+    а простаивающие сессии всегда в начале, и pop_idle забирает их пачкой,
+    не просматривая остальные.
+    """
+
+    def __init__(self, path=GPT_SESSIONS_DB, max_bytes=GPT_SESSIONS_MAX_BYTES, ttl=GPT_SESSION_TIMEOUT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self.loads = 0
+        self._sessions = OrderedDict()
+        # Учтённый объём каждой сессии в памяти и их сумма
+        self._sizes = {}
+        self._total_bytes = 0
+        # Изменённые, ещё не записанные сессии (держим ссылку, даже если вытеснены из памяти)
+        self._dirty = {}
+        self._deleted = set()
+        # Выданные сессии, пока на них есть ссылки (в том числе вытесненные, но ещё
+        # используемые генерацией ответа), — чтобы delete мог их закрыть
+        self._issued = weakref.WeakValueDictionary()
+        # chat_id -> время последней активности, от самой давней к последней
+        self._idle = OrderedDict()
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None or self._dirty or self._deleted:
+            self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _expired(self, context):
+        return time.time() - context.last_seen > self.ttl
+
+    def _load(self, chat_id):
+        context = self._dirty.get(chat_id)
+        if context is None:
+            # Вытесненную сессию может ещё держать генерация ответа: берём тот же объект,
+            # иначе копия с диска и эта сессия затрут друг друга при записи
+            context = self._issued.get(chat_id)
+        if context is None and chat_id not in self._deleted:
+            row = self.conn.execute("SELECT state FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+            if row is not None:
+                try:
+                    context = unpack(row[0])
+                except Exception as e:
+                    logger.error(f"Не удалось прочитать сессию GPT чата {chat_id}: {e}")
+                    self.delete(chat_id)
+                    return None
+                self.loads += 1
+                # После перезапуска сессия с диска должна истечь по таймеру, как и остальные
+                if chat_id not in self._idle:
+                    self._track_idle(chat_id, context.last_seen)
+        return context
+
+    def _track_idle(self, chat_id, last_seen):
+        """Добавляет чат в индекс активности, сохраняя порядок по времени."""
+        newest = next(reversed(self._idle.values()), None)
+        self._idle[chat_id] = last_seen
+        if newest is not None and last_seen < newest:
+            # Сессия с диска старше живых — редкий случай, пересортировка допустима
+            self._idle = OrderedDict(sorted(self._idle.items(), key=lambda item: item[1]))
+
+    def get(self, chat_id):
+        """Сессия чата (из памяти или с диска) или None, если её нет или она истекла."""
+        context = self._sessions.get(chat_id)
+        if context is None:
+            context = self._load(chat_id)
+            if context is None:
+                return None
+            if self._expired(context):
+                self.delete(chat_id)
+                return None
+            self._put(chat_id, context)
+        self._sessions.move_to_end(chat_id)
+        return context
+
+    def create(self, chat_id, system_prompt):
+        context = ChatContext(system_prompt)
+        self._deleted.discard(chat_id)
+        self._put(chat_id, context)
+        self.updated(chat_id, context)
+        return context
+
+    def _forget(self, chat_id):
+        self._sessions.pop(chat_id, None)
+        self._total_bytes -= self._sizes.pop(chat_id, 0)
+
+    def _put(self, chat_id, context):
+        self._forget(chat_id)
+        self._sessions[chat_id] = context
+        self._issued[chat_id] = context
+        self._sizes[chat_id] = context.size
+        self._total_bytes += context.size
+        self._evict()
+
+    def updated(self, chat_id, context):
+        """Отмечает сессию изменённой: обновляет учёт памяти и ставит в очередь на запись."""
+        if context.closed or chat_id in self._deleted:
+            # Сессия уже завершена (например, ответ догенерировался после /cancel);
+            # closed остаётся и после flush, когда метка удаления уже снята
+            return
+        context.last_seen = time.time()
+        self._idle[chat_id] = context.last_seen
+        self._idle.move_to_end(chat_id)
+        if self._sessions.get(chat_id) is context:
+            self._total_bytes += context.size - self._sizes[chat_id]
+            self._sizes[chat_id] = context.size
+            self._sessions.move_to_end(chat_id)
+        self._dirty[chat_id] = context
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            chat_id, context = next(iter(self._sessions.items()))
+            self._forget(chat_id)
+            self.evictions += 1
+            logger.info(f"Сессия GPT чата {chat_id} вытеснена из памяти ({context.size} байт)")
+
+    def delete(self, chat_id):
+        context = self._issued.pop(chat_id, None)
+        if context is not None:
+            context.closed = True
+        self._forget(chat_id)
+        self._dirty.pop(chat_id, None)
+        self._idle.pop(chat_id, None)
+        self._deleted.add(chat_id)
+
+    def pop_idle(self, now=None):
+        """Чаты, простаивающие дольше ttl; они убираются из индекса активности."""
+        deadline = (now if now is not None else time.time()) - self.ttl
+        expired = []
+        while self._idle:
+            chat_id, last_seen = next(iter(self._idle.items()))
+            if last_seen > deadline:
+                break
+            self._idle.popitem(last=False)
+            expired.append(chat_id)
+        return expired
+
+    def flush(self):
+        """Записывает изменённые сессии и удаляет завершённые одной транзакцией."""
+        if not self._dirty and not self._deleted:
+            return
+        dirty, self._dirty = self._dirty, {}
+        deleted, self._deleted = self._deleted, set()
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (chat_id, last_seen, state) VALUES (?, ?, ?)",
+                    [(chat_id, context.last_seen, pack(context)) for chat_id, context in dirty.items()])
+                self.conn.executemany("DELETE FROM sessions WHERE chat_id = ?",
+                                      [(chat_id,) for chat_id in deleted])
+                self.conn.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            logger.error(f"Не удалось сохранить сессии GPT: {e}")
+            # Повторим при следующем сбросе, не затирая более свежие изменения
+            for chat_id, context in dirty.items():
+                self._dirty.setdefault(chat_id, context)
+            self._deleted |= deleted - set(self._dirty)
+
+    def stats(self):
+        return {
+            "active": len(self._idle),
+            "sessions": len(self._sessions),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "loads": self.loads,
+            "pending": len(self._dirty) + len(self._deleted),
+            "persisted": self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+        }
+
+
+async def flush_sessions(context: CallbackContext):
+    session_store.flush()
+
+
+def schedule_session_flush(job_queue):
+    job_queue.run_repeating(flush_sessions, interval=GPT_SESSIONS_FLUSH_INTERVAL,
+                            first=GPT_SESSIONS_FLUSH_INTERVAL, name='gpt_sessions_flush')
+
+
+# Общее хранилище сессий GPT
+session_store = SessionStore()
@@ -0,0 +1,99 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Параметры пула процессов для отрисовки графиков
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', 2))
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', 64))
+# Рабочие процессы не форкаются из бота: fork из процесса с потоками и открытыми
+# SQLite-соединениями небезопасен. forkserver запускает их из чистого сервера
+CHART_START_METHOD = os.getenv(
+    'CHART_START_METHOD',
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def _init_worker():
+    # В рабочих процессах нет дисплея: только безголовый бэкенд
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def chart_key(render, *args):
+    """Хэш функции отрисовки и данных, по которым строится график."""
+    payload = json.dumps([render.__module__, render.__qualname__, args],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ChartRenderer:
+    """
+    Отрисовка графиков в ProcessPoolExecutor, чтобы не блокировать цикл событий.
+
+    render должна быть функцией уровня модуля (её передают в процесс по имени),
+    принимать только простые списки и числа и возвращать PNG в байтах;
+    matplotlib импортируется внутри неё, чтобы не грузить его в процесс бота.
+    Готовые PNG хранятся в памяти по хэшу данных, поэтому одинаковые данные
+    повторно не рисуются.
+    """
+
+    def __init__(self, workers=CHART_WORKERS, cache_size=CHART_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context(CHART_START_METHOD))
+            logger.info(f"Пул отрисовки графиков запущен: процессов {self.workers} ({CHART_START_METHOD})")
+        return self._executor
+
+    async def render(self, render, *args):
+        key = chart_key(render, *args)
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return png
+
+        # Одинаковые графики, запрошенные одновременно, рисуются один раз
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._render(key, render, args))
+            self._pending[key] = future
+            future.add_done_callback(lambda done: self._pending.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _render(self, key, render, args):
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self.executor, render, *args)
+        self._cache[key] = png
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return png
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info(f"Пул отрисовки графиков остановлен. Из кэша: {self.hits}, нарисовано: {self.misses}")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cache)}
+
+
+# Общий пул для всех модулей бота
+chart_renderer = ChartRenderer()
@@ -6,3 +6,11 @@ load_dotenv()
 # Токены и другие конфигурационные параметры
 TOKEN = os.getenv('BOT_TOKEN')
 HOST = os.getenv('HOST')
+
+# Toggl Plan
+TOGGL_ACCESS_TOKEN = os.getenv('ACCESS_TOKEN')
+TOGGL_REFRESH_TOKEN = os.getenv('TOGGL_REFRESH_TOKEN')
+TOGGL_CLIENT_ID = os.getenv('TOGGL_CLIENT_ID')
+TOGGL_CLIENT_SECRET = os.getenv('TOGGL_CLIENT_SECRET')
+TOGGL_REDIRECT_URI = os.getenv('TOGGL_REDIRECT_URI', 'https://github.com/eleron96/BIM_Assistent')
+TOGGL_WORKSPACE_ID = int(os.getenv('TOGGL_WORKSPACE_ID', 880544))
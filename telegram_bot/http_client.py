@@ -0,0 +1,89 @@
+import os
+import logging
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Параметры пула соединений
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 20))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+
+
+class PooledHttpClient:
+    """
+    Долгоживущая aiohttp-сессия с общим пулом соединений.
+
+    Создаётся один раз при старте приложения и закрывается при остановке,
+    поэтому повторные запросы к одному хосту переиспользуют уже открытые
+    TCP/TLS соединения. Считает открытые и переиспользованные соединения.
+    """
+
+    def __init__(self, limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+                 timeout=HTTP_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self._session = None
+
+    async def _on_connection_create_end(self, session, trace_context, params):
+        self.connections_opened += 1
+
+    async def _on_connection_reuseconn(self, session, trace_context, params):
+        self.connections_reused += 1
+
+    def _create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace_config],
+        )
+
+    @property
+    def session(self):
+        # Сессия создаётся лениво, если start() ещё не вызывался (например, в скриптах)
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info("HTTP-сессия создана")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"HTTP-сессия закрыта. {self.format_stats()}")
+        self._session = None
+
+    def stats(self):
+        return {
+            "opened": self.connections_opened,
+            "reused": self.connections_reused,
+        }
+
+    def format_stats(self):
+        return (f"Соединений открыто: {self.connections_opened}, "
+                f"переиспользовано: {self.connections_reused}")
+
+
+# Общий клиент для всех модулей бота
+http_client = PooledHttpClient()
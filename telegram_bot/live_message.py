@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def _retry_seconds(error):
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else float(retry_after)
+
+
+class LiveMessage:
+    """
+    Сообщение, которое правится на месте по мере появления нового текста.
+
+    Правки идут не чаще min_interval и пропускаются, если текст не изменился;
+    при RetryAfter от Telegram следующая правка откладывается на указанное время.
+    Клавиатура reply_markup сохраняется при каждой промежуточной правке.
+    """
+
+    def __init__(self, message, min_interval, reply_markup=None):
+        self.message = message
+        self.min_interval = min_interval
+        self.reply_markup = reply_markup
+        self.sent = None
+        self._last_text = None
+        self._pending = None
+        self._next_edit_at = 0.0
+        self._flush_task = None
+
+    async def start(self, text):
+        self.sent = await self.message.reply_text(text, disable_notification=True,
+                                                  reply_markup=self.reply_markup)
+        self._last_text = text
+
+    def update(self, text):
+        if self.sent is None:
+            return
+        self._pending = text
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        delay = self._next_edit_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        text, self._pending = self._pending, None
+        if text is not None:
+            await self._edit(text)
+
+    async def _edit(self, text, **kwargs):
+        if text == self._last_text and not kwargs:
+            return True
+        if 'reply_markup' not in kwargs and self.reply_markup is not None:
+            kwargs['reply_markup'] = self.reply_markup
+        try:
+            await self.sent.edit_text(text, **kwargs)
+        except RetryAfter as e:
+            self._next_edit_at = time.monotonic() + _retry_seconds(e)
+            logger.warning(f"Telegram просит подождать {_retry_seconds(e):.0f} с перед правкой")
+            return False
+        except BadRequest as e:
+            if kwargs.get('parse_mode') and "parse entities" in str(e):
+                # Разметка не разобралась (например, обрезанный блок кода) — отправляем как есть
+                kwargs.pop('parse_mode')
+                return await self._edit(text, **kwargs)
+            if 'not modified' not in str(e):
+                logger.error(f"Не удалось изменить сообщение: {e}")
+        self._last_text = text
+        self._next_edit_at = time.monotonic() + self.min_interval
+        return True
+
+    async def finish(self, text, **kwargs):
+        """Итоговая правка: дожидается окна по лимиту и не теряется при RetryAfter."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._pending = None
+        for attempt in range(3):
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if await self._edit(text, **kwargs):
+                return
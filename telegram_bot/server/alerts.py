@@ -0,0 +1,201 @@
+import os
+import json
+import logging
+from collections import deque
+
+from telegram_bot.handlers.security_check import white_list_user_ids
+
+logger = logging.getLogger(__name__)
+
+SERVER_ALERTS_ENABLED = os.getenv('SERVER_ALERTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Правила в JSON: [{"name": ..., "metric": ..., "op": ">", "threshold": ..., "clear": ..., "duration": ...}]
+SERVER_ALERT_RULES = os.getenv('SERVER_ALERT_RULES')
+# Сколько замеров подряд условие должно держаться, чтобы сменить состояние правила
+SERVER_ALERT_DEBOUNCE = int(os.getenv('SERVER_ALERT_DEBOUNCE', 3))
+
+DEFAULT_RULES = [
+    {"name": "CPU", "metric": "cpu", "op": ">", "threshold": 90, "clear": 80, "duration": 300, "unit": "%"},
+    {"name": "RAM", "metric": "ram", "op": ">", "threshold": 95, "clear": 90, "duration": 60, "unit": "%"},
+    {"name": "Свободно на диске", "metric": "disk_free_gb", "op": "<", "threshold": 5, "clear": 6,
+     "duration": 0, "unit": " GB"},
+]
+
+
+class SlidingMean:
+    """
+    Среднее за последние duration секунд: очередь замеров и бегущая сумма.
+
+    Каждый замер добавляется и удаляется из суммы ровно один раз — O(1) в среднем.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.samples = deque()
+        self.total = 0.0
+
+    def add(self, ts, value):
+        self.samples.append((ts, value))
+        self.total += value
+        while self.samples and self.samples[0][0] < ts - self.duration:
+            _, old = self.samples.popleft()
+            self.total -= old
+
+    def mean(self):
+        return self.total / len(self.samples) if self.samples else None
+
+    def covers(self, ts):
+        """Окно накоплено (хотя бы на 90% длительности), например после запуска бота."""
+        return bool(self.samples) and ts - self.samples[0][0] >= self.duration * 0.9
+
+
+class AlertRule:
+    """
+    Порог на среднее метрики за окно с гистерезисом.
+
+    Срабатывает, когда среднее переходит threshold, и снимается только
+    после перехода обратно через clear, поэтому значение около порога
+    не порождает серию уведомлений. Смена состояния требует debounce
+    замеров подряд.
+    """
+
+    def __init__(self, name, metric, op, threshold, clear=None, duration=0, unit="",
+                 debounce=SERVER_ALERT_DEBOUNCE):
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.clear = clear if clear is not None else threshold
+        self.duration = duration
+        self.unit = unit
+        self.debounce = debounce
+        self.window = SlidingMean(duration)
+        self.firing = False
+        self.last_value = None
+        self._streak = 0
+
+    def _breached(self, value):
+        return value > self.threshold if self.op == '>' else value < self.threshold
+
+    def _recovered(self, value):
+        return value < self.clear if self.op == '>' else value > self.clear
+
+    def describe(self):
+        window = f" в среднем за {self.duration // 60:.0f} мин" if self.duration >= 60 else ""
+        return f"{self.name} {self.op} {self.threshold}{self.unit}{window}"
+
+    def observe(self, ts, value):
+        """Учитывает замер; возвращает 'firing' или 'resolved' при смене состояния."""
+        self.window.add(ts, value)
+        if not self.window.covers(ts):
+            return None
+        mean = self.last_value = self.window.mean()
+
+        changing = self._recovered(mean) if self.firing else self._breached(mean)
+        self._streak = self._streak + 1 if changing else 0
+        if self._streak < self.debounce:
+            return None
+
+        self._streak = 0
+        self.firing = not self.firing
+        return 'firing' if self.firing else 'resolved'
+
+
+RULE_FIELDS = {'name', 'metric', 'op', 'threshold', 'clear', 'duration', 'unit', 'debounce'}
+REQUIRED_RULE_FIELDS = ('name', 'metric', 'op', 'threshold')
+NUMERIC_RULE_FIELDS = ('threshold', 'clear', 'duration', 'debounce')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def rule_errors(rule):
+    """Что не так с описанием правила из SERVER_ALERT_RULES; пустой список — правило годно."""
+    if not isinstance(rule, dict):
+        return ["правило должно быть объектом"]
+    errors = []
+    unknown = sorted(set(rule) - RULE_FIELDS)
+    if unknown:
+        errors.append(f"неизвестные поля {unknown}")
+    missing = [field for field in REQUIRED_RULE_FIELDS if field not in rule]
+    if missing:
+        errors.append(f"нет полей {missing}")
+    if 'op' in rule and rule['op'] not in ('>', '<'):
+        errors.append(f"op должен быть '>' или '<', а не {rule['op']!r}")
+    for field in NUMERIC_RULE_FIELDS:
+        value = rule.get(field)
+        if value is not None and not _is_number(value):
+            errors.append(f"{field} должен быть числом, а не {value!r}")
+    return errors
+
+
+class AlertEngine:
+    """Правила по метрикам сервера, проверяемые на каждом фоновом замере."""
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def from_config(cls, rules_json=SERVER_ALERT_RULES):
+        """
+        Правила из JSON; ошибка в настройке не должна ронять бота при импорте,
+        поэтому негодные правила пропускаются с записью в лог.
+        """
+        rules = DEFAULT_RULES
+        if rules_json:
+            try:
+                rules = json.loads(rules_json)
+            except ValueError as e:
+                logger.error(f"SERVER_ALERT_RULES не разобран, используются правила по умолчанию: {e}")
+            if not isinstance(rules, list):
+                logger.error("SERVER_ALERT_RULES должен быть списком правил, используются правила по умолчанию")
+                rules = DEFAULT_RULES
+        valid = []
+        for rule in rules:
+            errors = rule_errors(rule)
+            if errors:
+                logger.error(f"Правило оповещения {rule!r} пропущено: {'; '.join(errors)}")
+                continue
+            valid.append(AlertRule(**rule))
+        return cls(valid)
+
+    def observe(self, ts, metrics):
+        """metrics — {имя метрики: значение}; возвращает [(правило, событие)]."""
+        events = []
+        for rule in self.rules:
+            value = metrics.get(rule.metric)
+            if value is None:
+                continue
+            event = rule.observe(ts, value)
+            if event is not None:
+                events.append((rule, event))
+        return events
+
+    def format_status(self):
+        lines = ["🚨 Правила оповещений:"]
+        for rule in self.rules:
+            state = "🔴 сработало" if rule.firing else "🟢 норма"
+            value = f", сейчас {rule.last_value:.1f}{rule.unit}" if rule.last_value is not None else ""
+            lines.append(f"• {rule.describe()}: {state}{value}")
+        return "\n".join(lines)
+
+
+def format_event(rule, event):
+    if event == 'firing':
+        return f"🚨 {rule.describe()}: сейчас {rule.last_value:.1f}{rule.unit}"
+    return f"✅ {rule.name} снова в норме: {rule.last_value:.1f}{rule.unit}"
+
+
+async def notify(bot, events):
+    for rule, event in events:
+        text = format_event(rule, event)
+        logger.warning(f"Оповещение: {text}")
+        for user_id in white_list_user_ids:
+            try:
+                await bot.send_message(chat_id=user_id, text=text)
+            except Exception as e:
+                logger.error(f"Не удалось отправить оповещение пользователю {user_id}: {e}")
+
+
+# Общий набор правил оповещений
+alert_engine = AlertEngine.from_config()
@@ -0,0 +1,52 @@
+import io
+from datetime import datetime
+
+# Графики метрик сервера: текстовые спарклайны и история нагрузки для /server
+
+SPARK_BLOCKS = '▁▂▃▄▅▆▇█'
+
+
+def sparkline(values, width=24):
+    """Текстовый мини-график: значения усредняются до width точек."""
+    if not values:
+        return ''
+    step = max(1, -(-len(values) // width))
+    points = [sum(values[i:i + step]) / len(values[i:i + step]) for i in range(0, len(values), step)]
+    low, high = min(points), max(points)
+    span = (high - low) or 1
+    return ''.join(SPARK_BLOCKS[int((point - low) / span * (len(SPARK_BLOCKS) - 1))] for point in points)
+
+
+def render_history(series, title):
+    """CPU/RAM в процентах и скорость сети в KB/s по ряду из MetricsStore.series."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, (load_ax, net_ax) = plt.subplots(2, 1, figsize=(8, 5.5), dpi=120, sharex=True)
+    try:
+        times = [datetime.fromtimestamp(ts) for ts in series['ts']]
+        load_ax.plot(times, series['cpu'], color='#e53935', label='CPU')
+        load_ax.plot(times, series['ram'], color='#1e88e5', label='RAM')
+        load_ax.set_ylim(0, 100)
+        load_ax.set_ylabel('%')
+        load_ax.set_title(title)
+        load_ax.grid(alpha=0.3)
+        load_ax.legend(fontsize='small', loc='upper left')
+
+        net_ax.plot(times, [rate / 1024 for rate in series['sent_rate']], color='#43a047', label='Отправка')
+        net_ax.plot(times, [rate / 1024 for rate in series['recv_rate']], color='#fb8c00', label='Загрузка')
+        net_ax.set_ylim(bottom=0)
+        net_ax.set_ylabel('KB/s')
+        net_ax.grid(alpha=0.3)
+        net_ax.legend(fontsize='small', loc='upper left')
+        net_ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m %H:%M'))
+
+        fig.autofmt_xdate()
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
@@ -0,0 +1,228 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Сбор статистики контейнеров: таймаут на контейнер и число потоков
+DOCKER_STATS_TIMEOUT = float(os.getenv('DOCKER_STATS_TIMEOUT', 5))
+DOCKER_STATS_WORKERS = int(os.getenv('DOCKER_STATS_WORKERS', 16))
+# Интервал между двумя замерами one-shot, по которым считается загрузка CPU (в секундах)
+DOCKER_CPU_SAMPLE = float(os.getenv('DOCKER_CPU_SAMPLE', 0.5))
+# Как часто статистика контейнеров обновляется в фоне (в секундах)
+DOCKER_STATS_INTERVAL = float(os.getenv('DOCKER_STATS_INTERVAL', 15))
+
+
+def default_docker_client():
+    import docker
+    # Пул соединений к сокету Docker не меньше числа потоков сбора
+    return docker.from_env(timeout=int(DOCKER_STATS_TIMEOUT) + 1, max_pool_size=DOCKER_STATS_WORKERS)
+
+
+def container_name(container):
+    """Имя контейнера; у списка с sparse=True атрибута Name нет до reload(), есть только Names."""
+    if container.name:
+        return container.name
+    names = container.attrs.get('Names') or []
+    return names[0].lstrip('/') if names else container.short_id
+
+
+def _cpu_usage(stats):
+    cpu_stats = stats.get('cpu_stats') or {}
+    total = (cpu_stats.get('cpu_usage') or {}).get('total_usage')
+    system = cpu_stats.get('system_cpu_usage')
+    cpus = cpu_stats.get('online_cpus') or len((cpu_stats.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+    return total, system, cpus
+
+
+def cpu_percent(stats, baseline=None):
+    """
+    Загрузка CPU контейнера в процентах, как в `docker stats`.
+
+    В режиме one-shot precpu_stats пустой, поэтому точкой отсчёта служит
+    baseline — замер того же контейнера, снятый чуть раньше.
+    """
+    total, system, cpus = _cpu_usage(stats)
+    if total is None or system is None:
+        return None
+    if baseline is None:
+        baseline = {'cpu_stats': stats.get('precpu_stats') or {}}
+    pre_total, pre_system, _ = _cpu_usage(baseline)
+    if not pre_total or not pre_system:
+        return None
+    cpu_delta = total - pre_total
+    system_delta = system - pre_system
+    if cpu_delta < 0 or system_delta <= 0:
+        return None
+    return cpu_delta / system_delta * cpus * 100
+
+
+def memory_usage(stats):
+    memory = stats.get('memory_stats') or {}
+    usage = memory.get('usage')
+    if usage is None:
+        return None, None
+    # Как docker CLI: без файлового кэша (cgroup v2 — inactive_file, v1 — total_inactive_file)
+    details = memory.get('stats') or {}
+    usage -= details.get('inactive_file', details.get('total_inactive_file', 0))
+    return usage, memory.get('limit')
+
+
+def network_io(stats):
+    networks = (stats.get('networks') or {}).values()
+    return (sum(network.get('rx_bytes', 0) for network in networks),
+            sum(network.get('tx_bytes', 0) for network in networks))
+
+
+class ContainerStats:
+    """Статистика одного контейнера для раздела /server."""
+
+    def __init__(self, name, status, cpu=None, memory=None, memory_limit=None,
+                 rx_bytes=None, tx_bytes=None, restarts=0, error=None):
+        self.name = name
+        self.status = status
+        self.cpu = cpu
+        self.memory = memory
+        self.memory_limit = memory_limit
+        self.rx_bytes = rx_bytes
+        self.tx_bytes = tx_bytes
+        self.restarts = restarts
+        self.error = error
+
+
+class ContainerStatsCollector:
+    """
+    Статистика контейнеров Docker, собранная параллельно в пуле потоков.
+
+    SDK docker блокирующий, поэтому каждый контейнер опрашивается в своём
+    потоке (inspect + два замера stats в режиме one-shot через cpu_sample
+    секунд) с отдельным таймаутом: отчёт по десяткам контейнеров занимает
+    примерно время одного контейнера.
+    client_factory позволяет подставить клиент с заглушкой Docker API.
+    """
+
+    def __init__(self, client_factory=default_docker_client, timeout=DOCKER_STATS_TIMEOUT,
+                 workers=DOCKER_STATS_WORKERS, cpu_sample=DOCKER_CPU_SAMPLE):
+        self.client_factory = client_factory
+        self.timeout = timeout
+        self.workers = workers
+        self.cpu_sample = cpu_sample
+        self._client = None
+        self._executor = None
+        # Результат последнего фонового сбора: /server читает его, не дожидаясь Docker
+        self.snapshot = None
+        self.snapshot_at = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix='docker-stats')
+        return self._executor
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def _list_containers(self):
+        # sparse: без inspect каждого контейнера, его делаем параллельно в _container_stats
+        return self._get_client().containers.list(sparse=True)
+
+    def _container_stats(self, container):
+        container.reload()
+        attrs = container.attrs
+        name = container_name(container)
+        status = (attrs.get('State') or {}).get('Status', container.status)
+        restarts = attrs.get('RestartCount', 0)
+        if status != 'running':
+            return ContainerStats(name, status, restarts=restarts)
+
+        stats = container.stats(stream=False, one_shot=True)
+        cpu = cpu_percent(stats)
+        if cpu is None:
+            # precpu_stats пуст: второй замер через cpu_sample, CPU — за этот интервал
+            baseline = stats
+            time.sleep(self.cpu_sample)
+            stats = container.stats(stream=False, one_shot=True)
+            cpu = cpu_percent(stats, baseline)
+        memory, memory_limit = memory_usage(stats)
+        rx_bytes, tx_bytes = network_io(stats)
+        return ContainerStats(name, status, cpu, memory, memory_limit, rx_bytes, tx_bytes, restarts)
+
+    async def collect(self):
+        """Статистика всех запущенных контейнеров или None, если Docker недоступен."""
+        loop = asyncio.get_running_loop()
+        try:
+            containers = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, self._list_containers), self.timeout)
+        except Exception as e:
+            logger.warning(f"Docker недоступен: {e}")
+            self._client = None
+            return None
+
+        async def one(container):
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.executor, self._container_stats, container), self.timeout)
+            except asyncio.TimeoutError:
+                error = f"нет ответа за {self.timeout:.0f} с"
+            except Exception as e:
+                error = str(e)
+            name = container_name(container)
+            logger.warning(f"Не удалось получить статистику контейнера {name}: {error}")
+            return ContainerStats(name, container.status, error=error)
+
+        results = await asyncio.gather(*(one(container) for container in containers))
+        return sorted(results, key=lambda stats: stats.name or '')
+
+    async def refresh(self):
+        """Собирает статистику и сохраняет её как снимок для /server."""
+        self.snapshot = await self.collect()
+        self.snapshot_at = time.time()
+        return self.snapshot
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def format_bytes(value):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}" if unit != 'B' else f"{value} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+def format_containers(results, age=None):
+    """Раздел /server; age — сколько секунд назад собран снимок."""
+    if results is None:
+        return "🐳 Docker недоступен"
+    if not results:
+        return "🐳 Контейнеров нет"
+    updated = f", {age:.0f} с назад" if age is not None else ""
+    lines = [f"🐳 Контейнеры ({len(results)}{updated}):"]
+    for stats in results:
+        if stats.error:
+            lines.append(f"• {stats.name}: ⚠️ {stats.error}")
+            continue
+        if stats.memory is None:
+            lines.append(f"• {stats.name}: {stats.status}, перезапусков {stats.restarts}")
+            continue
+        cpu = f"{stats.cpu:.1f}%" if stats.cpu is not None else "—"
+        memory = format_bytes(stats.memory)
+        if stats.memory_limit:
+            memory += f" / {format_bytes(stats.memory_limit)}"
+        lines.append(
+            f"• {stats.name}: CPU {cpu}, RAM {memory}, "
+            f"сеть ↓{format_bytes(stats.rx_bytes)} ↑{format_bytes(stats.tx_bytes)}, "
+            f"перезапусков {stats.restarts}")
+    return "\n".join(lines)
+
+
+# Общий сборщик статистики контейнеров
+container_stats = ContainerStatsCollector()
@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+
+import numpy as np
+import psutil
+from telegram.ext import CallbackContext
+
+from telegram_bot.server.metrics_store import metrics_store
+from telegram_bot.server.alerts import alert_engine, notify, SERVER_ALERTS_ENABLED
+from telegram_bot.server.containers import container_stats, DOCKER_STATS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Интервал опроса метрик сервера и сколько секунд истории держать в памяти
+SERVER_SAMPLE_INTERVAL = float(os.getenv('SERVER_SAMPLE_INTERVAL', 5))
+SERVER_HISTORY_SECONDS = float(os.getenv('SERVER_HISTORY_SECONDS', 15 * 60))
+
+# Колонки кольцевого буфера
+FIELDS = ('ts', 'cpu', 'ram', 'disk_free', 'sent_rate', 'recv_rate', 'bytes_sent', 'bytes_recv')
+COLUMN = {field: i for i, field in enumerate(FIELDS)}
+
+
+class MetricsRing:
+    """
+    Кольцевой буфер замеров фиксированного размера поверх одного массива numpy.
+
+    Строка — один замер, колонки — FIELDS; новые замеры затирают самые старые.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, len(FIELDS)), dtype=np.float64)
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, values):
+        self.data[self.next] = values
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        return self.data[(self.next - 1) % self.capacity]
+
+    def since(self, ts):
+        """Замеры не старше ts в хронологическом порядке."""
+        if self.count < self.capacity:
+            rows = self.data[:self.count]
+        else:
+            rows = np.roll(self.data, -self.next, axis=0)
+        # Время замеров возрастает — начало окна находим двоичным поиском
+        start = np.searchsorted(rows[:, COLUMN['ts']], ts, side='left')
+        return rows[start:]
+
+
+class MetricsSampler:
+    """
+    Фоновый опрос CPU, RAM, диска и сети через psutil без блокировки цикла событий.
+
+    cpu_percent вызывается с interval=None и считает загрузку с прошлого вызова,
+    скорость сети — по разнице счётчиков между замерами.
+    """
+
+    def __init__(self, interval=SERVER_SAMPLE_INTERVAL, history_seconds=SERVER_HISTORY_SECONDS):
+        self.interval = interval
+        self.ring = MetricsRing(int(history_seconds // interval) + 1)
+        self._last_net = None
+        self._last_ts = None
+        # Первый вызов cpu_percent(None) лишь запоминает точку отсчёта
+        psutil.cpu_percent(interval=None)
+
+    def sample(self):
+        now = time.time()
+        net = psutil.net_io_counters()
+        if self._last_net is not None and now > self._last_ts:
+            elapsed = now - self._last_ts
+            sent_rate = (net.bytes_sent - self._last_net.bytes_sent) / elapsed
+            recv_rate = (net.bytes_recv - self._last_net.bytes_recv) / elapsed
+        else:
+            sent_rate = recv_rate = 0.0
+        self._last_net = net
+        self._last_ts = now
+
+        values = (now, psutil.cpu_percent(interval=None), psutil.virtual_memory().percent,
+                  psutil.disk_usage('/').free, max(sent_rate, 0.0), max(recv_rate, 0.0),
+                  net.bytes_sent, net.bytes_recv)
+        self.ring.append(values)
+        return self.ring.latest()
+
+    def current(self):
+        """Последний замер; если опрос ещё не запускался — замер прямо сейчас."""
+        latest = self.ring.latest()
+        return latest if latest is not None else self.sample()
+
+    def averages(self, seconds):
+        """Средние CPU, RAM и скорости сети за последние seconds секунд."""
+        rows = self.ring.since(time.time() - seconds)
+        if len(rows) == 0:
+            return None
+        means = rows.mean(axis=0)
+        return {field: float(means[COLUMN[field]]) for field in ('cpu', 'ram', 'sent_rate', 'recv_rate')}
+
+    def peaks(self, seconds):
+        """Пиковые значения за последние seconds секунд."""
+        rows = self.ring.since(time.time() - seconds)
+        if len(rows) == 0:
+            return None
+        maxima = rows.max(axis=0)
+        return {field: float(maxima[COLUMN[field]]) for field in ('cpu', 'sent_rate', 'recv_rate')}
+
+
+async def sample_metrics(context: CallbackContext):
+    try:
+        sample = metrics_sampler.sample()
+        # Замер сразу попадает в историю и её агрегаты
+        metrics_store.add(*(sample[COLUMN[field]] for field in ('ts', 'cpu', 'ram', 'sent_rate', 'recv_rate')))
+    except Exception as e:
+        logger.error(f"Ошибка опроса метрик сервера: {e}")
+        return
+
+    if SERVER_ALERTS_ENABLED:
+        events = alert_engine.observe(sample[COLUMN['ts']], {
+            'cpu': sample[COLUMN['cpu']],
+            'ram': sample[COLUMN['ram']],
+            'disk_free_gb': sample[COLUMN['disk_free']] / 1024 / 1024 / 1024,
+            'sent_rate': sample[COLUMN['sent_rate']],
+            'recv_rate': sample[COLUMN['recv_rate']],
+        })
+        if events:
+            await notify(context.bot, events)
+
+
+async def sample_containers(context: CallbackContext):
+    # Отдельная задача: медленный Docker не задерживает замеры хоста и проверку оповещений
+    try:
+        await container_stats.refresh()
+    except Exception as e:
+        logger.error(f"Ошибка сбора статистики контейнеров: {e}")
+
+
+def schedule_metrics_sampler(job_queue):
+    job_queue.run_repeating(sample_metrics, interval=metrics_sampler.interval, first=0,
+                            name='server_metrics')
+    job_queue.run_repeating(sample_containers, interval=DOCKER_STATS_INTERVAL, first=0,
+                            name='container_stats')
+    logger.info(f"Опрос метрик сервера каждые {metrics_sampler.interval:.0f} с, "
+                f"контейнеров — каждые {DOCKER_STATS_INTERVAL:.0f} с")
+
+
+# Общий сборщик метрик сервера
+metrics_sampler = MetricsSampler()
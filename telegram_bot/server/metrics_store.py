@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+import sqlite3
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# История метрик сервера на диске
+SERVER_METRICS_DB = os.getenv('SERVER_METRICS_DB', 'data/metrics.sqlite3')
+
+# Уровни хранения: таблица, размер корзины и сколько хранить (в секундах).
+# Корзина 0 — сырые замеры без агрегации.
+TIERS = (
+    ('samples_raw', 0, 60 * 60),
+    ('rollup_1m', 60, 24 * 60 * 60),
+    ('rollup_15m', 15 * 60, 30 * 24 * 60 * 60),
+)
+
+# Периоды /server history: длительность и уровень, из которого строится график
+PERIODS = {
+    'hour': (60 * 60, 'samples_raw'),
+    'day': (24 * 60 * 60, 'rollup_1m'),
+    'week': (7 * 24 * 60 * 60, 'rollup_15m'),
+    'month': (30 * 24 * 60 * 60, 'rollup_15m'),
+}
+
+METRICS = ('cpu', 'ram', 'sent_rate', 'recv_rate')
+
+SCHEMA = "\n".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket REAL PRIMARY KEY,
+    count INTEGER NOT NULL,
+    {", ".join(f"{metric}_sum REAL NOT NULL, {metric}_max REAL NOT NULL" for metric in METRICS)}
+);"""
+    for table, _, _ in TIERS)
+
+UPSERT = (
+    "INSERT INTO {table} (bucket, count, "
+    + ", ".join(f"{metric}_sum, {metric}_max" for metric in METRICS)
+    + ") VALUES (?, 1, " + ", ".join("?, ?" for _ in METRICS) + ") "
+    "ON CONFLICT(bucket) DO UPDATE SET count = count + 1, "
+    + ", ".join(f"{metric}_sum = {metric}_sum + excluded.{metric}_sum, "
+                f"{metric}_max = max({metric}_max, excluded.{metric}_max)" for metric in METRICS)
+)
+
+
+class MetricsStore:
+    """
+    Временной ряд метрик сервера в SQLite с прореживанием по уровням.
+
+    Каждый замер сразу добавляется в текущие корзины всех уровней (сумма,
+    число и максимум), поэтому агрегаты не пересчитываются по сырым данным,
+    а график за месяц читает не больше пары тысяч строк. Старые строки
+    удаляются по сроку хранения уровня, так что размер базы ограничен.
+    """
+
+    def __init__(self, path=SERVER_METRICS_DB):
+        self.path = path
+        self._conn = None
+        self._pruned_at = 0.0
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add(self, ts, cpu, ram, sent_rate, recv_rate):
+        values = []
+        for value in (cpu, ram, sent_rate, recv_rate):
+            values.extend((float(value), float(value)))
+        with self.conn:
+            for table, bucket_size, _ in TIERS:
+                bucket = ts if bucket_size == 0 else ts - ts % bucket_size
+                self.conn.execute(UPSERT.format(table=table), (bucket, *values))
+            # Старые строки удаляем не чаще раза в минуту
+            if ts - self._pruned_at >= 60:
+                self._prune(ts)
+                self._pruned_at = ts
+
+    def _prune(self, now):
+        for table, _, retention in TIERS:
+            self.conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (now - retention,))
+
+    def series(self, period):
+        """
+        Ряд за период из PERIODS: время и средние/максимумы по корзинам.
+
+        Возвращает словарь списков: ts, cpu, ram, sent_rate, recv_rate и *_max.
+        """
+        duration, table = PERIODS[period]
+        rows = self.conn.execute(
+            f"SELECT bucket, count, "
+            + ", ".join(f"{metric}_sum, {metric}_max" for metric in METRICS)
+            + f" FROM {table} WHERE bucket >= ? ORDER BY bucket",
+            (time.time() - duration,)).fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(len(rows), 2 + 2 * len(METRICS))
+        series = {'ts': data[:, 0].tolist()}
+        counts = data[:, 1]
+        for i, metric in enumerate(METRICS):
+            series[metric] = (data[:, 2 + 2 * i] / counts).tolist()
+            series[f"{metric}_max"] = data[:, 3 + 2 * i].tolist()
+        return series
+
+
+# Общее хранилище истории метрик
+metrics_store = MetricsStore()
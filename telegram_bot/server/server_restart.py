@@ -1,11 +1,15 @@
 import os
+import time
+import asyncio
+import getpass
 import logging
-import requests
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import CallbackContext
 from dotenv import load_dotenv
 
 from telegram_bot.handlers.security_check import is_user_whitelisted
+from telegram_bot.http_client import http_client
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
@@ -15,43 +19,167 @@ logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
+TIMEWEB_API_URL = os.getenv('TIMEWEB_API_URL', 'https://api.timeweb.cloud/api/v1')
+TIMEWEB_SERVER_ID = os.getenv('TIMEWEB_SERVER_ID', '3109085')
+# Опрос состояния сервера: первая пауза, множитель, максимальная пауза и общий лимит (в секундах)
+TIMEWEB_POLL_INITIAL = float(os.getenv('TIMEWEB_POLL_INITIAL', 2))
+TIMEWEB_POLL_FACTOR = float(os.getenv('TIMEWEB_POLL_FACTOR', 1.5))
+TIMEWEB_POLL_MAX = float(os.getenv('TIMEWEB_POLL_MAX', 15))
+TIMEWEB_REBOOT_TIMEOUT = float(os.getenv('TIMEWEB_REBOOT_TIMEOUT', 600))
+# Если за это время сервер ни разу не был недоступен, а сейчас включён — считаем перезагрузку завершённой
+TIMEWEB_NO_DOWNTIME_GRACE = float(os.getenv('TIMEWEB_NO_DOWNTIME_GRACE', 120))
+
+ONLINE_STATUS = 'on'
+
+
+def timeweb_headers():
+    return {
+        'Content-Type': 'application/json',
+        'Authorization': 'Bearer ' + os.getenv('TIMEWEB_CLOUD_TOKEN', ''),
+    }
+
+
+def server_url(path=''):
+    return f"{TIMEWEB_API_URL}/servers/{TIMEWEB_SERVER_ID}{path}"
+
 
 async def restart_server():
+    """Отправляет команду перезагрузки. Возвращает текст ошибки или None."""
     try:
         logger.debug(
             "Попытка выполнить команду перезагрузки через Timeweb Cloud API")
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': 'Bearer ' + os.getenv('TIMEWEB_CLOUD_TOKEN', ''),
-        }
-        response = requests.post(
-            'https://api.timeweb.cloud/api/v1/servers/3109085/reboot',
-            headers=headers)
-
-        if response.status_code == 200:
-            logger.debug("Команда перезагрузки выполнена успешно")
-        else:
+        async with http_client.session.post(server_url('/reboot'), headers=timeweb_headers()) as response:
+            if 200 <= response.status < 300:
+                logger.debug("Команда перезагрузки выполнена успешно")
+                return None
+            text = await response.text()
             logger.error(
-                f"Ошибка при выполнении команды перезагрузки: {response.status_code} - {response.text}")
+                f"Ошибка при выполнении команды перезагрузки: {response.status} - {text}")
+            return f"{response.status} - {text}"
     except Exception as e:
         logger.error(f"Ошибка при выполнении команды перезагрузки: {e}")
+        return str(e)
+
+
+async def get_server_state():
+    """Статус сервера из Timeweb ('on', 'off', 'rebooting', ...) или None, если API недоступен."""
+    try:
+        async with http_client.session.get(server_url(), headers=timeweb_headers()) as response:
+            if response.status != 200:
+                logger.warning(f"Timeweb вернул {response.status} на запрос состояния сервера")
+                return None
+            data = await response.json()
+            return (data.get('server') or {}).get('status')
+    except Exception as e:
+        logger.warning(f"Не удалось получить состояние сервера: {e}")
+        return None
+
+
+def format_elapsed(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes} мин {seconds} с" if minutes else f"{seconds} с"
+
+
+class RebootOperation:
+    """
+    Одна перезагрузка: команда в Timeweb и фоновый опрос состояния сервера.
+
+    Ход перезагрузки (перезагрузка → выключен → в сети) отображается
+    правками одного сообщения со временем от начала.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self.started_at = time.monotonic()
+        self.lines = []
+        self._last_text = None
+
+    def elapsed(self):
+        return format_elapsed(time.monotonic() - self.started_at)
+
+    async def report(self, line):
+        self.lines.append(f"{line} ({self.elapsed()})")
+        text = "\n".join(self.lines)
+        if text == self._last_text:
+            return
+        try:
+            await self.message.edit_text(text)
+            self._last_text = text
+        except BadRequest as e:
+            if 'not modified' not in str(e):
+                logger.error(f"Не удалось изменить сообщение о перезагрузке: {e}")
+        except Exception as e:
+            logger.error(f"Не удалось изменить сообщение о перезагрузке: {e}")
+
+    async def run(self):
+        try:
+            await self._run()
+        except Exception as e:
+            logger.error(f"Ошибка при отслеживании перезагрузки: {e}")
+
+    async def _run(self):
+        error = await restart_server()
+        if error is not None:
+            await self.report(f"❌ Ошибка при выполнении команды перезагрузки: {error}")
+            return
+        await self.report("🔄 Команда перезагрузки отправлена")
+
+        went_offline = False
+        delay = TIMEWEB_POLL_INITIAL
+        last_status = None
+        while time.monotonic() - self.started_at < TIMEWEB_REBOOT_TIMEOUT:
+            await asyncio.sleep(delay)
+            delay = min(delay * TIMEWEB_POLL_FACTOR, TIMEWEB_POLL_MAX)
+
+            status = await get_server_state()
+            if status is not None and status != last_status:
+                last_status = status
+                logger.debug(f"Состояние сервера: {status}")
+                if status != ONLINE_STATUS:
+                    # Каждая смена состояния (rebooting, off, ...) — отдельная строка
+                    went_offline = True
+                    await self.report(f"⏳ Сервер недоступен: {status}")
+                elif went_offline:
+                    await self.report("✅ Сервер снова в сети")
+                    return
+
+            if (not went_offline and last_status == ONLINE_STATUS
+                    and time.monotonic() - self.started_at >= TIMEWEB_NO_DOWNTIME_GRACE):
+                await self.report("✅ Сервер в сети, простоя не замечено")
+                return
+
+        await self.report(f"⚠️ Сервер не вернулся в сеть за {format_elapsed(TIMEWEB_REBOOT_TIMEOUT)}")
+
+
+async def run_reboot(message, first_name):
+    # Определяем имя пользователя, под которым работает скрипт
+    user_name = getpass.getuser()
+    logger.debug(f"Скрипт выполняется под пользователем: {user_name}")
+
+    status_message = await message.reply_text(
+        f"🔄 Перезагрузка сервера, {first_name}...\n"
+        f"Скрипт выполняется под пользователем: {user_name}"
+    )
+    operation = RebootOperation(status_message)
+    operation.lines.append(status_message.text)
+    await operation.run()
+
+
+_current_reboot = None
 
 
 async def server_restart(update: Update, context: CallbackContext):
+    global _current_reboot
     user_id = update.effective_user.id
     if not is_user_whitelisted(user_id):
         await update.message.reply_text('Отказано в доступе.')
         return
 
-    # Определяем имя пользователя, под которым работает скрипт
-    user_name = os.popen("whoami").read().strip()
-    logger.debug(f"Скрипт выполняется под пользователем: {user_name}")
+    # Повторные нажатия во время перезагрузки не запускают новую
+    if _current_reboot is not None and not _current_reboot.done():
+        await update.message.reply_text("🔄 Перезагрузка уже выполняется, следите за сообщением выше.")
+        return
 
+    # Перезагружаем сервер в фоне: обработчик сразу освобождает очередь обновлений
     user = update.message.from_user
-    await update.message.reply_text(
-        f"🔄 Перезагрузка сервера, {user.first_name}...\n"
-        f"Скрипт выполняется под пользователем: {user_name}"
-    )
-
-    # Перезагружаем сервер
-    await restart_server()
+    _current_reboot = asyncio.create_task(run_reboot(update.message, user.first_name))
@@ -4,26 +4,18 @@ import time
 from datetime import timedelta
 from telegram import Update
 from telegram.ext import CallbackContext
-import asyncio
 
 from telegram_bot.handlers.security_check import is_user_whitelisted
+from telegram_bot.server.metrics import metrics_sampler, COLUMN
+from telegram_bot.server.metrics_store import metrics_store, PERIODS
+from telegram_bot.server.charts import render_history, sparkline
+from telegram_bot.server.containers import container_stats, format_containers
+from telegram_bot.server.alerts import alert_engine
+from telegram_bot.chart_pool import chart_renderer
 
+# Окна средних значений в /server, в минутах
+AVERAGE_WINDOWS = (1, 5, 15)
 
-async def collect_net_stats(interval=5):
-    net_io_1 = psutil.net_io_counters()
-    await asyncio.sleep(interval)
-    net_io_2 = psutil.net_io_counters()
-
-    sent_bytes = net_io_2.bytes_sent - net_io_1.bytes_sent
-    recv_bytes = net_io_2.bytes_recv - net_io_1.bytes_recv
-
-    sent_speed = sent_bytes / interval / 1024  # в KB/s
-    recv_speed = recv_bytes / interval / 1024  # в KB/s
-
-    sent_mb = net_io_2.bytes_sent / 1024 / 1024  # в MB
-    recv_mb = net_io_2.bytes_recv / 1024 / 1024  # в MB
-
-    return sent_speed, recv_speed, sent_mb, recv_mb
 
 def get_server_status():
     # Получаем имя сервера
@@ -34,43 +26,96 @@ def get_server_status():
     uptime_seconds = time.time() - boot_time
     uptime = str(timedelta(seconds=uptime_seconds)).split('.')[0]
 
-    # Получаем загрузку CPU
-    cpu_load = psutil.cpu_percent(interval=1)
-
-    # Получаем загрузку RAM
-    ram_usage = psutil.virtual_memory().percent
-
-    # Получаем свободное место на диске
-    disk_usage = psutil.disk_usage('/')
-    free_disk_space = disk_usage.free / 1024 / 1024 / 1024  # в GB
+    # Текущие значения — из последнего фонового замера, без ожидания
+    sample = metrics_sampler.current()
 
     status = {
         "server_name": server_name,
         "uptime": uptime,
-        "cpu_load": cpu_load,
-        "ram_usage": ram_usage,
-        "free_disk_space": free_disk_space
+        "cpu_load": sample[COLUMN['cpu']],
+        "ram_usage": sample[COLUMN['ram']],
+        "free_disk_space": sample[COLUMN['disk_free']] / 1024 / 1024 / 1024,  # в GB
+        "sent_speed": sample[COLUMN['sent_rate']] / 1024,  # в KB/s
+        "recv_speed": sample[COLUMN['recv_rate']] / 1024,  # в KB/s
+        "sent_mb": sample[COLUMN['bytes_sent']] / 1024 / 1024,  # в MB
+        "recv_mb": sample[COLUMN['bytes_recv']] / 1024 / 1024,  # в MB
     }
 
     return status
 
+def format_series(values, field, scale=1, digits=1):
+    return " / ".join(f"{value[field] / scale:.{digits}f}" for value in values)
+
+
+PERIOD_TITLES = {'hour': 'за час', 'day': 'за сутки', 'week': 'за неделю', 'month': 'за 30 дней'}
+
+
+async def server_history(update: Update, period):
+    if period not in PERIODS:
+        await update.message.reply_text(f"Формат: /server history [{'|'.join(PERIODS)}]")
+        return
+
+    series = metrics_store.series(period)
+    if len(series['ts']) < 2:
+        await update.message.reply_text("История метрик ещё не накоплена, попробуйте позже.")
+        return
+
+    title = f"{platform.node()}: нагрузка {PERIOD_TITLES[period]}"
+    png = await chart_renderer.render(render_history, series, title)
+    caption = (
+        f"🔥 CPU {sparkline(series['cpu'])} макс {max(series['cpu_max']):.1f}%\n"
+        f"💾 RAM {sparkline(series['ram'])} макс {max(series['ram_max']):.1f}%"
+    )
+    await update.message.reply_photo(png, caption=caption)
+
+
 async def server_status(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
     if not is_user_whitelisted(user_id):
         await update.message.reply_text('Отказано в доступе.')
         return
 
+    if context.args and context.args[0] == 'history':
+        await server_history(update, context.args[1] if len(context.args) > 1 else 'hour')
+        return
+    if context.args and context.args[0] == 'alerts':
+        await update.message.reply_text(alert_engine.format_status())
+        return
+
     status = get_server_status()
-    sent_speed, recv_speed, sent_mb, recv_mb = await collect_net_stats()
     message = (
         f"💻 Сервер: {status['server_name']}\n"
         f"⏱ Аптайм: {status['uptime']}\n"
-        f"🔥 CPU: {status['cpu_load']}%\n"
-        f"💾 RAM: {status['ram_usage']}%\n"
+        f"🔥 CPU: {status['cpu_load']:.1f}%\n"
+        f"💾 RAM: {status['ram_usage']:.1f}%\n"
         f"💽 Свободно на диске: {status['free_disk_space']:.2f} GB\n"
-        f"🔼 Средняя отправка: {sent_speed:.2f} KB/s\n"
-        f"🔽 Средняя загрузка: {recv_speed:.2f} KB/s\n"
-        f"📤 Отправлено: {sent_mb:.2f} MB\n"
-        f"📥 Загружено: {recv_mb:.2f} MB"
+        f"🔼 Отправка: {status['sent_speed']:.2f} KB/s\n"
+        f"🔽 Загрузка: {status['recv_speed']:.2f} KB/s\n"
+        f"📤 Отправлено: {status['sent_mb']:.2f} MB\n"
+        f"📥 Загружено: {status['recv_mb']:.2f} MB"
     )
+
+    averages = [metrics_sampler.averages(minutes * 60) for minutes in AVERAGE_WINDOWS]
+    if all(averages):
+        labels = "/".join(str(minutes) for minutes in AVERAGE_WINDOWS)
+        message += (
+            f"\n\n📊 Средние за {labels} мин:\n"
+            f"🔥 CPU: {format_series(averages, 'cpu')}%\n"
+            f"💾 RAM: {format_series(averages, 'ram')}%\n"
+            f"🔼 Отправка: {format_series(averages, 'sent_rate', 1024, 2)} KB/s\n"
+            f"🔽 Загрузка: {format_series(averages, 'recv_rate', 1024, 2)} KB/s"
+        )
+    peaks = metrics_sampler.peaks(AVERAGE_WINDOWS[-1] * 60)
+    if peaks:
+        message += (
+            f"\n\n⛰ Пики за {AVERAGE_WINDOWS[-1]} мин: CPU {peaks['cpu']:.1f}%, "
+            f"🔼 {peaks['sent_rate'] / 1024:.2f} KB/s, 🔽 {peaks['recv_rate'] / 1024:.2f} KB/s"
+        )
+
+    # Контейнеры, как и метрики хоста, — из последнего фонового сбора, без ожидания Docker
+    if container_stats.snapshot_at is None:
+        message += "\n\n🐳 Статистика контейнеров ещё собирается"
+    else:
+        message += "\n\n" + format_containers(container_stats.snapshot,
+                                                time.time() - container_stats.snapshot_at)
     await update.message.reply_text(message)
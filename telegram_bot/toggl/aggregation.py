@@ -0,0 +1,269 @@
+import json
+import logging
+import warnings
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Весовые коэффициенты статистики по пользователям
+USER_WEIGHT_DONE = 0.8
+USER_WEIGHT_INPROGRESS = 1.1
+USER_BAR_SIZE = 5
+
+# Весовые коэффициенты статистики по проектам
+PROJECT_WEIGHT_DONE = 0.8
+PROJECT_WEIGHT_BLOCKED = 1
+PROJECT_WEIGHT_REMAINING = 1.2
+PROJECT_BAR_SIZE = 10
+
+# Минимальный хвост окна после конца последнего дня (в долях дня), ради которого
+# burn-down получает отдельную точку на текущий момент
+BURNDOWN_MIN_TAIL = 1 / 24
+
+
+def _categorical(values):
+    # Категории в порядке первого появления — от него зависит порядок проектов с равным числом задач;
+    # factorize проходит значения один раз, None получает код -1 (NaN)
+    codes, categories = pd.factorize(pd.Series(values, dtype=object))
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+class TaskFrame:
+    """
+    Нормализованные детали задач.
+
+    tasks — одна строка на задачу: task_id, категориальные project и status;
+    memberships — развёрнутые участники: номер строки задачи и membership_id.
+    """
+
+    def __init__(self, tasks, memberships):
+        self.tasks = tasks
+        self.memberships = memberships
+
+    def __len__(self):
+        return len(self.tasks)
+
+
+def _int_array(values, count):
+    # membership_id в Toggl целые; иначе оставляем объекты
+    values = list(values)
+    try:
+        return np.fromiter(values, dtype=np.int64, count=count)
+    except (TypeError, ValueError, OverflowError):
+        return np.array(values, dtype=object)
+
+
+def task_fields(task_detail):
+    """Поля деталей задачи, нужные отчётам: (проект, статус, список membership_id)."""
+    project_name = (task_detail.get("project") or {}).get("name", "Unknown")
+    return (project_name if project_name is not None else "None",
+            (task_detail.get("plan_status") or {}).get("name"),
+            task_detail.get("workspace_members") or [])
+
+
+def _make_frame(task_ids, projects, statuses, lengths, membership_ids):
+    tasks = pd.DataFrame({
+        "task_id": pd.Series(task_ids, dtype=object),
+        "project": _categorical(projects),
+        "status": _categorical(statuses),
+    })
+    memberships = pd.DataFrame({
+        "row": np.repeat(np.arange(len(lengths)), lengths),
+        "membership_id": membership_ids,
+    })
+    return TaskFrame(tasks, memberships)
+
+
+def build_task_frame(task_details):
+    """Переводит детали задач в TaskFrame за один проход."""
+    task_ids = []
+    projects = []
+    statuses = []
+    members = []
+    for task_detail in task_details:
+        if "error" in task_detail:
+            continue
+        project_name = (task_detail.get("project") or {}).get("name", "Unknown")
+        task_ids.append(task_detail.get("id"))
+        projects.append(project_name if project_name is not None else "None")
+        statuses.append((task_detail.get("plan_status") or {}).get("name"))
+        members.append(task_detail.get("workspace_members") or [])
+
+    lengths = np.fromiter(map(len, members), dtype=np.int64, count=len(members))
+    return _make_frame(task_ids, projects, statuses, lengths,
+                       _int_array(chain.from_iterable(members), int(lengths.sum())))
+
+
+# Скобки и запятые JSON-списков превращаются в пробелы, чтобы разобрать все id одним np.fromstring
+_JSON_LIST_SEPARATORS = str.maketrans('[],', '   ')
+
+
+def _members_from_json(members):
+    """
+    Списки участников из JSON-строк: (длины списков, все membership_id подряд).
+
+    Целые id разбираются одной строкой без промежуточных списков на каждую задачу;
+    на сотнях тысяч задач такие списки заметно нагружают сборщик мусора.
+    """
+    lengths = np.fromiter((text.count(',') + 1 if text != '[]' else 0 for text in members),
+                          dtype=np.int64, count=len(members))
+    with warnings.catch_warnings():
+        # На не целых id fromstring останавливается с предупреждением — это видно по числу id
+        warnings.simplefilter('ignore', DeprecationWarning)
+        try:
+            membership_ids = np.fromstring(" ".join(members).translate(_JSON_LIST_SEPARATORS),
+                                           dtype=np.int64, sep=' ')
+        except ValueError:
+            membership_ids = None
+    if membership_ids is None or len(membership_ids) != lengths.sum():
+        parsed = [json.loads(text) for text in members]
+        lengths = np.fromiter(map(len, parsed), dtype=np.int64, count=len(parsed))
+        membership_ids = _int_array(chain.from_iterable(parsed), int(lengths.sum()))
+    return lengths, membership_ids
+
+
+def task_frame_from_rows(rows):
+    """
+    TaskFrame из строк хранилища (id, проект, статус, участники в JSON).
+
+    Поля уже извлечены при синхронизации, поэтому детали задач не разбираются.
+    """
+    task_ids, projects, statuses, members = ([row[i] for row in rows] for i in range(4))
+    lengths, membership_ids = _members_from_json(members)
+    return _make_frame(task_ids, projects, statuses, lengths, membership_ids)
+
+
+def _bars(counts, symbols):
+    # Строка из символов для каждой комбинации длин, собранная без цикла по строкам
+    if len(counts[0]) == 0:
+        return []
+    parts = [np.char.multiply(symbol, np.asarray(count, dtype=int)) for symbol, count in zip(symbols, counts)]
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return result.tolist()
+
+
+def user_stats(frame, members_by_id, members_by_membership_id, mask=None):
+    """
+    Done / In progress / всего задач по пользователям и шкала прогресса.
+
+    Строки в порядке members_by_id, как в [user_id, name, шкала, done, in progress, total].
+    mask — необязательный булев массив по задачам: учитываются только отмеченные.
+    """
+    user_ids = pd.Index(list(members_by_id.keys()))
+    membership_ids = pd.Index(list(members_by_membership_id.keys()))
+    # Позиция пользователя для каждого membership_id
+    membership_user_pos = user_ids.get_indexer(
+        [member['id'] for member in members_by_membership_id.values()])
+
+    tasks = frame.tasks
+    positions = membership_ids.get_indexer(frame.memberships["membership_id"].to_numpy())
+    known = positions >= 0
+    if mask is not None:
+        known &= np.asarray(mask, dtype=bool)[frame.memberships["row"].to_numpy()]
+    rows = frame.memberships["row"].to_numpy()[known]
+    user_pos = membership_user_pos[positions[known]]
+
+    is_done = (tasks["status"] == "Done").to_numpy()[rows]
+    is_inprogress = (tasks["status"] == "In progress").to_numpy()[rows]
+    size = len(user_ids)
+    total = np.bincount(user_pos, minlength=size)
+    done = np.bincount(user_pos, weights=is_done, minlength=size).astype(int)
+    inprogress = np.bincount(user_pos, weights=is_inprogress, minlength=size).astype(int)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        task_ids = tasks["task_id"].to_numpy()[rows]
+        inprogress_tasks = pd.Series(task_ids[is_inprogress]).groupby(
+            user_pos[is_inprogress]).agg(list)
+        for pos, user_id in enumerate(user_ids):
+            logger.debug(
+                f"User {members_by_id[user_id]['name']} (ID: {user_id}) has the following "
+                f"In progress tasks: {inprogress_tasks.get(pos, [])}")
+
+    done_weight = done * USER_WEIGHT_DONE
+    inprogress_weight = inprogress * USER_WEIGHT_INPROGRESS
+    total_weight = done_weight + inprogress_weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        done_percentage = np.where(total_weight > 0, done_weight / total_weight, 0)
+
+    num_done = np.floor(done_percentage * USER_BAR_SIZE).astype(int)
+    symbols = _bars([num_done, USER_BAR_SIZE - num_done], ['🟩', '🟨'])
+
+    return [
+        [user_id, members_by_id[user_id]['name'], task_symbols, task_done, task_inprogress, task_count]
+        for user_id, task_symbols, task_done, task_inprogress, task_count in zip(
+            user_ids.tolist(), symbols, done.tolist(), inprogress.tolist(), total.tolist())
+    ]
+
+
+def project_stats(frame, mask=None):
+    """
+    Done / Blocked / всего задач по проектам и взвешенная шкала прогресса.
+
+    Проекты по убыванию числа задач, "Unknown" в конце,
+    как [project, шкала, done, blocked, total].
+    mask — необязательный булев массив по задачам: учитываются только отмеченные.
+    """
+    tasks = frame.tasks
+    codes = tasks["project"].cat.codes.to_numpy()
+    names = tasks["project"].cat.categories
+    is_done = (tasks["status"] == "Done").to_numpy()
+    is_blocked = (tasks["status"] == "Blocked").to_numpy()
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        codes, is_done, is_blocked = codes[mask], is_done[mask], is_blocked[mask]
+    size = len(names)
+
+    total = np.bincount(codes, minlength=size)
+    done = np.bincount(codes, weights=is_done, minlength=size).astype(int)
+    blocked = np.bincount(codes, weights=is_blocked, minlength=size).astype(int)
+
+    # Первое появление проекта среди учтённых задач разрешает равенства по числу задач
+    first_seen = np.full(size, len(codes))
+    np.minimum.at(first_seen, codes, np.arange(len(codes)))
+
+    # lexsort сортирует по последнему ключу; проекты без задач отбрасываются
+    order = np.lexsort((first_seen, -total, names == "Unknown"))
+    order = order[total[order] > 0]
+
+    # Для проектов без задач получаются NaN, но они уже отброшены в order
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_done = done / total
+        percent_blocked = blocked / total
+        percent_remaining = 1 - percent_done - percent_blocked
+
+        adjusted_percent_done = percent_done * PROJECT_WEIGHT_DONE
+        adjusted_percent_blocked = percent_blocked * PROJECT_WEIGHT_BLOCKED
+        adjusted_percent_remaining = percent_remaining * PROJECT_WEIGHT_REMAINING
+        total_adjusted_percent = adjusted_percent_done + adjusted_percent_blocked + adjusted_percent_remaining
+
+        num_done = np.nan_to_num(np.round((adjusted_percent_done / total_adjusted_percent) * PROJECT_BAR_SIZE)).astype(int)
+        num_blocked = np.nan_to_num(np.round((adjusted_percent_blocked / total_adjusted_percent) * PROJECT_BAR_SIZE)).astype(int)
+    num_remaining = PROJECT_BAR_SIZE - num_done - num_blocked
+    symbols = _bars([num_done, num_blocked, num_remaining], ['🟩', '🟥', '🟨'])
+
+    return [
+        [names[i], symbols[i], int(done[i]), int(blocked[i]), int(total[i])]
+        for i in order.tolist()
+    ]
+
+
+def burndown(created, done_at, since, until, step=86400):
+    """
+    Число незавершённых задач на конец каждого дня окна [since, until].
+
+    created и done_at — время создания и завершения задач в секундах эпохи,
+    NaN в done_at — задача не завершена. Возвращает (концы дней, остаток задач).
+    Точка на until добавляется, только если он заметно позже конца последнего дня.
+    """
+    ends = np.arange(since + step, until, step)
+    if not len(ends) or until - ends[-1] >= BURNDOWN_MIN_TAIL * step:
+        ends = np.append(ends, until)
+    created = np.sort(np.asarray(created, dtype=np.float64))
+    done_at = np.asarray(done_at, dtype=np.float64)
+    done_at = np.sort(done_at[~np.isnan(done_at)])
+    remaining = np.searchsorted(created, ends, side='right') - np.searchsorted(done_at, ends, side='right')
+    return ends.tolist(), remaining.tolist()
@@ -0,0 +1,131 @@
+import os
+import json
+import asyncio
+import logging
+
+import aiohttp
+
+from telegram_bot.config import TOGGL_WORKSPACE_ID
+from telegram_bot.http_client import http_client
+from telegram_bot.toggl.scheduler import FanOutScheduler
+from telegram_bot.toggl.http_cache import response_cache, cache_key
+from telegram_bot.toggl.token_manager import token_manager
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.plan.toggl.com/api/v5"
+TOGGL_MAX_RETRIES = int(os.getenv('TOGGL_MAX_RETRIES', 5))
+
+
+def parse_retry_after(value, default=1.0):
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class TogglClient:
+    """
+    Клиент Toggl Plan API поверх общей HTTP-сессии бота.
+
+    Все модули toggl ходят в API только через него, поэтому нажатия кнопок
+    меню переиспользуют уже прогретые соединения к api.plan.toggl.com.
+    """
+
+    def __init__(self, http, tokens, workspace_id, scheduler=None,
+                 retries=TOGGL_MAX_RETRIES, cache=None):
+        self.http = http
+        self.tokens = tokens
+        self.scheduler = scheduler or FanOutScheduler()
+        self.cache = cache
+        self.workspace_id = workspace_id
+        self.retries = retries
+
+    async def fetch(self, url, params=None):
+        """JSON ответа API или {"error": ...}; сетевые сбои тоже возвращаются ошибкой."""
+        try:
+            return await self._fetch(url, params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Сбой одного запроса не должен обрывать всю синхронизацию
+            logger.error(f"Ошибка соединения с Toggl: {e!r}, URL: {url}")
+            return {"error": f"Ошибка соединения с Toggl: {e!r}"}
+
+    async def _fetch(self, url, params=None):
+        key = cache_key(url, params)
+        # Условный запрос: при неизменных данных API отвечает 304 без тела
+        validators = self.cache.validators(key) if self.cache else {}
+        auth_retried = False
+        for attempt in range(self.retries):
+            headers = await self.tokens.headers()
+            if not headers:
+                return {"error": "Нет действующего токена Toggl"}
+            async with self.scheduler.slot():
+                async with self.http.session.get(url, headers={**headers, **validators},
+                                                 params=params) as response:
+                    content_type = response.headers.get('Content-Type', '')
+                    if response.status == 401:
+                        # Токен отозван или истёк раньше срока: одно обновление и повтор
+                        if not auth_retried and await self.tokens.refresh(
+                                failed_token=headers["Authorization"][len("Bearer "):]):
+                            auth_retried = True
+                            continue
+                        logger.error(f"Toggl отклонил токен, URL: {url}")
+                        return {"error": "Toggl отклонил токен доступа"}
+                    if response.status == 429:
+                        # Пауза общая для всех запросов, повтор после неё
+                        self.scheduler.backoff(parse_retry_after(response.headers.get('Retry-After')))
+                        continue
+                    if response.status == 304:
+                        body = self.cache.get(key)
+                        if body is not None:
+                            return json.loads(body)
+                        # Запись успели вытеснить — повторяем запрос без валидаторов
+                        validators = {}
+                        continue
+                    if 'application/json' in content_type:
+                        body = await response.text()
+                        if self.cache and response.status == 200:
+                            self.cache.put(key, body,
+                                           etag=response.headers.get('ETag'),
+                                           last_modified=response.headers.get('Last-Modified'))
+                        return json.loads(body)
+                    else:
+                        text = await response.text()
+                        logger.error(
+                            f"Unexpected content type: {content_type}, URL: {url}, Response: {text}")
+                        return {"error": f"Unexpected content type: {content_type}"}
+        return {"error": "Exceeded maximum retries"}
+
+    def workspace_url(self, path, workspace_id=None):
+        return f"{API_URL}/{workspace_id or self.workspace_id}/{path}"
+
+    async def get_workspace_members(self):
+        url = self.workspace_url("members")
+        logger.debug(f"Запрос URL: {url}")
+        return await self.fetch(url)
+
+    async def get_all_tasks(self, params=None):
+        url = self.workspace_url("tasks")
+        logger.debug(f"Запрос URL: {url} {params or ''}")
+        return await self.fetch(url, params=params or None)
+
+    async def get_task_detail(self, task_id):
+        url = self.workspace_url(f"tasks/{task_id}")
+        logger.debug(f"Запрос URL: {url}")
+        return await self.fetch(url)
+
+    async def get_task_details(self, task_ids, label='task details', on_result=None):
+        return await self.scheduler.map(self.get_task_detail, task_ids, label=label,
+                                        on_result=on_result)
+
+    async def get_workspace_milestones(self, workspace_id=None):
+        url = self.workspace_url("milestones", workspace_id)
+        logger.debug(f"Запрос URL: {url}")
+        return await self.fetch(url)
+
+    def connection_stats(self):
+        return self.http.stats()
+
+
+toggl_client = TogglClient(http_client, token_manager, TOGGL_WORKSPACE_ID,
+                           cache=response_cache)
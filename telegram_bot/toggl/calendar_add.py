@@ -1,7 +1,4 @@
-import aiohttp
 import logging
-from dotenv import load_dotenv
-import os
 from datetime import datetime, timedelta
 from telegram import InputFile
 from telegram.ext import CallbackContext
@@ -9,47 +6,13 @@ from icalendar import Calendar, Event
 import pytz
 import io
 
+from telegram_bot.toggl.milestones import milestone_cache
+
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S')
 
-# Загрузка переменных окружения из файла .env
-load_dotenv()
-
-# Получение токена доступа из переменной окружения
-access_token = os.getenv('ACCESS_TOKEN')
-
-if not access_token:
-    logging.error("ACCESS_TOKEN не найден в .env файле")
-    exit(1)
-
-# Идентификатор рабочего пространства
-workspace_id = 880544
-
-# Заголовки запроса
-headers = {
-    "Authorization": f"Bearer {access_token}"
-}
-
-
-async def fetch(session, url):
-    async with session.get(url, headers=headers) as response:
-        content_type = response.headers.get('Content-Type', '')
-        if 'application/json' in content_type:
-            return await response.json()
-        else:
-            text = await response.text()
-            logging.error(
-                f"Unexpected content type: {content_type}, URL: {url}, Response: {text}")
-            return {"error": f"Unexpected content type: {content_type}"}
-
-
-async def get_workspace_milestones(session, workspace_id):
-    url = f"https://api.plan.toggl.com/api/v5/{workspace_id}/milestones"
-    logging.debug(f"Запрос URL: {url}")
-    return await fetch(session, url)
-
 
 def extract_code_and_name(name):
     if '[' in name and ']' in name:
@@ -61,12 +24,6 @@ def extract_code_and_name(name):
     return '', name
 
 
-async def fetch_milestones():
-    async with aiohttp.ClientSession() as session:
-        milestones = await get_workspace_milestones(session, workspace_id)
-        return milestones
-
-
 def create_ics_file(events):
     cal = Calendar()
     for event_name, deadline in events:
@@ -86,7 +43,7 @@ def create_ics_file(events):
 
 async def generate_calendar_link(callback_query, context: CallbackContext):
     logging.debug("Starting generate_calendar_link function")
-    milestones = await fetch_milestones()
+    milestones = await milestone_cache.get()
     logging.debug(f"Fetched milestones: {milestones}")
 
     events = []
@@ -0,0 +1,92 @@
+import io
+from datetime import datetime
+
+# Графики отчётов Toggl: задачи пользователей и проектов по статусам, burn-down окна
+
+COLOR_DONE = '#4caf50'
+COLOR_BLOCKED = '#e53935'
+COLOR_INPROGRESS = '#fbc02d'
+COLOR_OTHER = '#b0bec5'
+
+
+def _stacked_barh(labels, series, title):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, max(2.5, 0.45 * len(labels) + 1.2)), dpi=120)
+    try:
+        positions = range(len(labels))
+        left = [0] * len(labels)
+        for name, values, color in series:
+            ax.barh(positions, values, left=left, color=color, label=name)
+            left = [a + b for a, b in zip(left, values)]
+        ax.set_yticks(list(positions), labels)
+        ax.invert_yaxis()
+        ax.set_xlabel('Задачи')
+        ax.set_title(title)
+        # Легенда под осью, чтобы не закрывать столбцы
+        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.12 * 4 / fig.get_figheight()),
+                  ncol=len(series), fontsize='small', frameon=False)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def render_user_chart(table_data, title):
+    """Done / In progress / прочие задачи по пользователям из строк stat_by_user."""
+    labels = [row[1] for row in table_data]
+    done = [row[3] for row in table_data]
+    inprogress = [row[4] for row in table_data]
+    other = [row[5] - row[3] - row[4] for row in table_data]
+    return _stacked_barh(labels, [
+        ('Done', done, COLOR_DONE),
+        ('In progress', inprogress, COLOR_INPROGRESS),
+        ('Остальные', other, COLOR_OTHER),
+    ], title)
+
+
+def render_project_chart(project_data, title):
+    """Done / Blocked / To-do по проектам из строк stat_by_projects."""
+    labels = [row[0] for row in project_data]
+    done = [row[2] for row in project_data]
+    blocked = [row[3] for row in project_data]
+    todo = [row[4] - row[2] - row[3] for row in project_data]
+    return _stacked_barh(labels, [
+        ('Done', done, COLOR_DONE),
+        ('Blocked', blocked, COLOR_BLOCKED),
+        ('To-do', todo, COLOR_INPROGRESS),
+    ], title)
+
+
+def render_burndown(ends, remaining, title):
+    """Остаток незавершённых задач по дням окна."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, ax = plt.subplots(figsize=(8, 4), dpi=120)
+    try:
+        days = [datetime.fromtimestamp(end) for end in ends]
+        ax.plot(days, remaining, color=COLOR_BLOCKED, marker='o', markersize=3, label='Осталось')
+        if remaining:
+            # Идеальная линия — от пика объёма работ до нуля к концу окна
+            peak = remaining.index(max(remaining))
+            ax.plot([days[peak], days[-1]], [remaining[peak], 0], color=COLOR_OTHER,
+                    linestyle='--', label='Идеально')
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+        ax.set_ylim(bottom=0)
+        ax.set_ylabel('Задачи')
+        ax.set_title(title)
+        ax.grid(alpha=0.3)
+        ax.legend(fontsize='small')
+        fig.autofmt_xdate()
+        fig.tight_layout()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
@@ -1,48 +1,15 @@
-import aiohttp
 import logging
-from dotenv import load_dotenv
-import os
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 
+from telegram_bot.toggl.milestones import milestone_cache
+
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S')
 
-# Загрузка переменных окружения из файла .env
-load_dotenv()
-
-# Получение токена доступа из переменной окружения
-access_token = os.getenv('ACCESS_TOKEN')
-
-if not access_token:
-    logging.error("ACCESS_TOKEN не найден в .env файле")
-    exit(1)
-
-# Идентификатор рабочего пространства
-workspace_id = 880544
-
-# Заголовки запроса
-headers = {
-    "Authorization": f"Bearer {access_token}"
-}
-
-async def fetch(session, url):
-    async with session.get(url, headers=headers) as response:
-        content_type = response.headers.get('Content-Type', '')
-        if 'application/json' in content_type:
-            return await response.json()
-        else:
-            text = await response.text()
-            logging.error(f"Unexpected content type: {content_type}, URL: {url}, Response: {text}")
-            return {"error": f"Unexpected content type: {content_type}"}
-
-async def get_workspace_milestones(session, workspace_id):
-    url = f"https://api.plan.toggl.com/api/v5/{workspace_id}/milestones"
-    logging.debug(f"Запрос URL: {url}")
-    return await fetch(session, url)
 
 def format_date(date_str):
     try:
@@ -67,13 +34,11 @@ def extract_code_and_name(name):
     return '', name
 
 
-async def fetch_milestones():
-    async with aiohttp.ClientSession() as session:
-        milestones = await get_workspace_milestones(session, workspace_id)
-        return milestones
-
-async def deadline_info(update: Update, context: CallbackContext):
-    milestones = await fetch_milestones()
+async def deadline_info(update: Update, context: CallbackContext, refresh=False):
+    if refresh:
+        # Кнопка Refresh now: вехи запрашиваются заново, минуя кэш
+        milestone_cache.invalidate()
+    milestones = await milestone_cache.get()
 
     if isinstance(milestones, list):
         past_milestones = []
@@ -110,7 +75,8 @@ async def deadline_info(update: Update, context: CallbackContext):
         report_text = "\n".join(report_lines)
 
         keyboard = [
-            [InlineKeyboardButton("Add to Calendar", callback_data='add_to_calendar')],
+            [InlineKeyboardButton("Add to Calendar", callback_data='add_to_calendar'),
+             InlineKeyboardButton("Refresh now", callback_data='refresh_deadline_info')],
             [InlineKeyboardButton("Back", callback_data='back_from_info')]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
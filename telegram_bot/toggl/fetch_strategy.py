@@ -0,0 +1,65 @@
+import os
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Сужение списка /tasks на стороне API: только задачи за последние N дней (0 — без фильтра)
+TOGGL_TASKS_SINCE_DAYS = int(os.getenv('TOGGL_TASKS_SINCE_DAYS', 0))
+
+
+def _nested_field(key):
+    def available(task):
+        if key not in task:
+            return False
+        value = task[key]
+        # null — это ответ API ("нет проекта"), а не отсутствие данных
+        return value is None or (isinstance(value, dict) and 'name' in value)
+    return available
+
+
+# Поля деталей задачи, которые используют отчёты, и проверка их наличия в записи списка
+REQUIRED_FIELDS = {
+    'project.name': _nested_field('project'),
+    'plan_status.name': _nested_field('plan_status'),
+    'workspace_members': lambda task: isinstance(task.get('workspace_members'), list),
+}
+
+
+def missing_fields(task):
+    return [field for field, available in REQUIRED_FIELDS.items() if not available(task)]
+
+
+def split_by_detail_need(tasks):
+    """
+    Делит задачи на те, что можно взять прямо из списка /tasks,
+    и те, для которых нужен запрос /tasks/{id}.
+
+    Возвращает ({id: задача из списка}, [id для запроса деталей]).
+    """
+    ready = {}
+    need_detail = []
+    missing_counts = {field: 0 for field in REQUIRED_FIELDS}
+    for task in tasks:
+        missing = missing_fields(task)
+        if missing:
+            need_detail.append(task['id'])
+            for field in missing:
+                missing_counts[field] += 1
+            logger.debug(f"Задача {task['id']}: нет полей {missing} в списке, нужен запрос деталей")
+        else:
+            ready[task['id']] = task
+
+    if tasks:
+        for field, missing in missing_counts.items():
+            logger.info(f"Поле {field}: из списка {len(tasks) - missing}, нужен запрос деталей {missing}")
+        logger.info(f"Детали из списка: {len(ready)}, отдельных запросов: {len(need_detail)}")
+    return ready, need_detail
+
+
+def task_list_params():
+    """Параметры запроса /tasks для сужения выборки на стороне API."""
+    params = {}
+    if TOGGL_TASKS_SINCE_DAYS > 0:
+        params['since'] = (datetime.now() - timedelta(days=TOGGL_TASKS_SINCE_DAYS)).strftime('%Y-%m-%d')
+    return params
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Кэш ответов Toggl Plan API с валидаторами (ETag / Last-Modified)
+TOGGL_HTTP_CACHE_PATH = os.getenv('TOGGL_HTTP_CACHE_PATH', 'data/http_cache.sqlite3')
+TOGGL_HTTP_CACHE_MAX_BYTES = int(os.getenv('TOGGL_HTTP_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def cache_key(url, params=None):
+    if not params:
+        return url
+    query = "&".join(f"{key}={value}" for key, value in sorted(params.items()))
+    return f"{url}?{query}"
+
+
+class ResponseCache:
+    """
+    Тела ответов с их валидаторами в SQLite на диске.
+
+    Переживает перезапуск контейнера; общий размер ограничен max_bytes,
+    при переполнении вытесняются давно не использованные записи (LRU).
+    Время обращений при 304 копится в памяти и пишется пачкой — в транзакции
+    put перед вытеснением и при закрытии, — чтобы ответ из кэша не ждал диска.
+    """
+
+    def __init__(self, path=TOGGL_HTTP_CACHE_PATH, max_bytes=TOGGL_HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.revalidated = 0
+        self.refetched = 0
+        self.evictions = 0
+        self._total_bytes = None
+        self._conn = None
+        # key -> время последнего обращения, ещё не записанное на диск
+        self._accessed = {}
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.executescript(SCHEMA)
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            with self._conn:
+                self._write_accessed()
+            self._conn.close()
+            self._conn = None
+
+    def validators(self, key):
+        """Заголовки условного запроса для ранее сохранённого ответа."""
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM responses WHERE key = ?", (key,)).fetchone()
+        headers = {}
+        if row:
+            etag, last_modified = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def get(self, key):
+        """Тело ответа для 304; отмечает запись как недавно использованную."""
+        row = self.conn.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._accessed[key] = time.time()
+        self.revalidated += 1
+        return row[0]
+
+    def put(self, key, body, etag=None, last_modified=None):
+        self.refetched += 1
+        if not etag and not last_modified:
+            return
+        size = len(body.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.conn:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, last_modified, body, size, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, etag, last_modified, body, size, time.time()))
+            self._total_bytes += size - (old[0] if old else 0)
+            self._accessed.pop(key, None)
+            self._write_accessed()
+            self._evict()
+
+    def _write_accessed(self):
+        # Вызывается внутри транзакции: порядок LRU на диске должен быть свежим до вытеснения
+        if self._accessed:
+            accessed, self._accessed = self._accessed, {}
+            self.conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                  [(accessed_at, key) for key, accessed_at in accessed.items()])
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            row = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "revalidated": self.revalidated,
+            "refetched": self.refetched,
+            "evictions": self.evictions,
+            "bytes": self._total_bytes or 0,
+        }
+
+
+response_cache = ResponseCache()
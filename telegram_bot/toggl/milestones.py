@@ -0,0 +1,63 @@
+import os
+import time
+import asyncio
+import logging
+
+from telegram_bot.toggl.api_client import toggl_client
+
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша вех в секундах
+TOGGL_MILESTONES_TTL = float(os.getenv('TOGGL_MILESTONES_TTL', 300))
+
+
+class MilestoneCache:
+    """
+    Кэш /milestones по рабочим пространствам с TTL.
+
+    Deadline Info и Add to Calendar читают вехи отсюда, поэтому кнопка
+    календаря отвечает по тем же данным, что пользователь только что видел.
+    """
+
+    def __init__(self, client, ttl=TOGGL_MILESTONES_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._locks = {}
+
+    async def get(self, workspace_id=None):
+        workspace_id = workspace_id or self.client.workspace_id
+        lock = self._locks.setdefault(workspace_id, asyncio.Lock())
+        # Одновременные промахи по одному пространству делают один запрос
+        async with lock:
+            entry = self._entries.get(workspace_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            milestones = await self.client.get_workspace_milestones(workspace_id)
+            # Ошибки не кэшируем
+            if isinstance(milestones, list):
+                self._entries[workspace_id] = (time.monotonic(), milestones)
+            return milestones
+
+    def invalidate(self, workspace_id=None):
+        if workspace_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(workspace_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+milestone_cache = MilestoneCache(toggl_client)
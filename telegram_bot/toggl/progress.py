@@ -0,0 +1,32 @@
+import os
+from collections import Counter
+
+from telegram_bot.live_message import LiveMessage
+
+# Минимальный интервал (в секундах) между правками одного сообщения
+TOGGL_EDIT_INTERVAL = float(os.getenv('TOGGL_EDIT_INTERVAL', 1.5))
+
+
+def progress_bar(done, total, size=10):
+    filled = round(size * done / total) if total else size
+    return '▓' * filled + '░' * (size - filled)
+
+
+class ProgressMessage(LiveMessage):
+    """Сообщение-заглушка, которое правится по мере загрузки задач."""
+
+    def __init__(self, message, min_interval=TOGGL_EDIT_INTERVAL):
+        super().__init__(message, min_interval)
+        self.tally = Counter()
+
+    async def start(self, text="⏳ Загружаю данные Toggl..."):
+        await super().start(text)
+
+    def on_task(self, done, total, task_detail):
+        """Колбэк для TaskStore.sync: учитывает задачу и планирует правку."""
+        if "error" not in task_detail:
+            self.tally[(task_detail.get("plan_status") or {}).get("name")] += 1
+        self.update(
+            f"⏳ Загружено задач: {done}/{total}\n"
+            f"{progress_bar(done, total)} {done * 100 // total}%\n"
+            f"✅ {self.tally['Done']}  🛑 {self.tally['Blocked']}  🚧 {self.tally['In progress']}")
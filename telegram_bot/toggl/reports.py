@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.constants import ChatAction
+from telegram.ext import CallbackContext
+
+from telegram_bot.toggl.stat_by_user import generate_stat_by_user, format_table_data
+from telegram_bot.toggl.stat_by_projects import generate_stat_by_projects, format_project_report
+from telegram_bot.toggl.workspace import load_overview
+from telegram_bot.toggl.progress import ProgressMessage
+from telegram_bot.toggl.time_index import DEFAULT_WINDOW
+from telegram_bot.toggl.charts import render_user_chart, render_project_chart, render_burndown
+from telegram_bot.chart_pool import chart_renderer
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в секундах) пересчитывать отчёты в фоне
+TOGGL_REPORT_INTERVAL = float(os.getenv('TOGGL_REPORT_INTERVAL', 600))
+
+
+class ReportSnapshot:
+    """Готовый к отправке текст отчёта, его окно и время построения."""
+
+    def __init__(self, text, window=DEFAULT_WINDOW, built_at=None):
+        self.text = text
+        self.window = window
+        self.built_at = built_at if built_at is not None else time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+
+async def build_stat_by_user(force=False, progress=None, window=DEFAULT_WINDOW):
+    table_data = await generate_stat_by_user(force=force, progress=progress, window=window)
+    if isinstance(table_data, str):
+        return table_data, False
+    return format_table_data(table_data), True
+
+
+async def build_stat_by_projects(force=False, progress=None, window=DEFAULT_WINDOW):
+    project_data = await generate_stat_by_projects(force=force, progress=progress, window=window)
+    if isinstance(project_data, str):
+        return project_data, False
+    return format_project_report(project_data), True
+
+
+async def build_workspace_overview(force=False, progress=None, window=DEFAULT_WINDOW):
+    overview = await load_overview(force=force, progress=progress, window=window)
+    if isinstance(overview, str):
+        return overview, False
+    return (f"{format_table_data(overview.table_data)}\n"
+            f"{format_project_report(overview.project_data)}"), True
+
+
+# Обзор идёт первым: остальные отчёты при фоновом обновлении берут его результат из памяти
+REPORT_BUILDERS = {
+    'workspace_overview': build_workspace_overview,
+    'stat_by_user': build_stat_by_user,
+    'stat_by_projects': build_stat_by_projects,
+}
+
+# Последние успешно построенные отчёты по (имени, ключу окна)
+snapshots = {}
+_refresh_locks = {}
+
+
+def _prune_snapshots():
+    # Снимки произвольных окон старше TOGGL_REPORT_INTERVAL не показываются — не копим их
+    # и их блокировки; снимки окна по умолчанию обновляются в фоне и остаются
+    for key in [key for key, snapshot in snapshots.items()
+                if key[1] != DEFAULT_WINDOW.key and snapshot.age >= TOGGL_REPORT_INTERVAL]:
+        del snapshots[key]
+    for key in [key for key, lock in _refresh_locks.items()
+                if key not in snapshots and not lock.locked()]:
+        del _refresh_locks[key]
+
+
+async def refresh_report(name, force=False, progress=None, window=DEFAULT_WINDOW):
+    """
+    Перестраивает отчёт за окно window и сохраняет снимок.
+
+    Возвращает (снимок, ошибка); при ошибке остаётся предыдущий снимок.
+    """
+    key = (name, window.key)
+    _prune_snapshots()
+    lock = _refresh_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        text, ok = await REPORT_BUILDERS[name](force=force, progress=progress, window=window)
+        if ok:
+            snapshots[key] = ReportSnapshot(text, window)
+            return snapshots[key], None
+        logger.error(f"Не удалось обновить отчёт {name} за {window.label}: {text}")
+        return snapshots.get(key), text
+
+
+async def refresh_reports(context: CallbackContext):
+    # В фоне обновляется только окно по умолчанию, остальные строятся по запросу
+    for name in REPORT_BUILDERS:
+        try:
+            await refresh_report(name)
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления отчёта {name}: {e}")
+
+
+def schedule_report_jobs(job_queue):
+    job_queue.run_repeating(refresh_reports, interval=TOGGL_REPORT_INTERVAL, first=5,
+                            name='toggl_reports')
+    logger.info(f"Фоновое обновление отчётов Toggl каждые {TOGGL_REPORT_INTERVAL:.0f} с")
+
+
+def format_age(seconds):
+    if seconds < 60:
+        return "только что"
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин назад"
+    return f"{minutes // 60} ч {minutes % 60} мин назад"
+
+
+def format_snapshot(snapshot):
+    return f"```\n{snapshot.text}\n```\n_За {snapshot.window.label}, обновлено {format_age(snapshot.age)}_"
+
+
+async def send_report(update, context: CallbackContext, name, refresh=False, window=DEFAULT_WINDOW):
+    keyboard = [[InlineKeyboardButton("Refresh now", callback_data=f'refresh_{name}'),
+                 InlineKeyboardButton("Charts", callback_data=f'chart_{name}')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    snapshot = None if refresh else snapshots.get((name, window.key))
+    # Снимки окон кроме основного в фоне не обновляются — старые строим заново
+    if snapshot is not None and window.key != DEFAULT_WINDOW.key and snapshot.age >= TOGGL_REPORT_INTERVAL:
+        snapshot = None
+    if snapshot is not None:
+        await update.message.reply_text(format_snapshot(snapshot), parse_mode="Markdown",
+                                        reply_markup=reply_markup)
+        return
+
+    # Снимка ещё нет (или просили обновить): сразу показываем заглушку
+    # и правим её по мере загрузки задач
+    progress = ProgressMessage(update.message)
+    await progress.start()
+    try:
+        snapshot, error = await refresh_report(name, force=refresh, progress=progress.on_task,
+                                               window=window)
+    except Exception as e:
+        # Заглушка не должна остаться висеть с последним процентом загрузки
+        logger.error(f"Ошибка построения отчёта {name} за {window.label}: {e}")
+        await progress.finish(f"Не удалось построить отчёт: {e}")
+        return
+    if snapshot is None:
+        await progress.finish(error)
+        return
+
+    text = format_snapshot(snapshot)
+    if error is not None:
+        text = f"Не удалось обновить данные: {error}\n{text}"
+    await progress.finish(text, parse_mode="Markdown", reply_markup=reply_markup)
+
+
+# Графики каждого отчёта
+REPORT_CHARTS = {
+    'workspace_overview': ('users', 'projects', 'burndown'),
+    'stat_by_user': ('users', 'burndown'),
+    'stat_by_projects': ('projects', 'burndown'),
+}
+
+
+def chart_jobs(overview, charts):
+    window = overview.window.label
+    jobs = {
+        'users': (render_user_chart, overview.table_data, f"Задачи по пользователям за {window}"),
+        'projects': (render_project_chart, overview.project_data, f"Задачи по проектам за {window}"),
+        'burndown': (render_burndown, *overview.burndown, f"Burn-down за {window}"),
+    }
+    return [jobs[chart] for chart in charts]
+
+
+async def send_charts(update, context: CallbackContext, name, window=DEFAULT_WINDOW):
+    overview = await load_overview(window=window)
+    if isinstance(overview, str):
+        await update.message.reply_text(overview)
+        return
+
+    await update.message.reply_chat_action(ChatAction.UPLOAD_PHOTO)
+    # Отрисовка идёт в пуле процессов, одинаковые данные берутся из кэша PNG
+    pngs = await asyncio.gather(*(chart_renderer.render(*job)
+                                  for job in chart_jobs(overview, REPORT_CHARTS[name])))
+    if len(pngs) == 1:
+        await update.message.reply_photo(pngs[0])
+    else:
+        await update.message.reply_media_group([InputMediaPhoto(png) for png in pngs])
+    logger.debug(f"Графики {name}: {chart_renderer.stats()}")
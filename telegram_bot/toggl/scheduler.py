@@ -0,0 +1,139 @@
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Ограничения на запросы к Toggl Plan API
+TOGGL_MAX_CONCURRENCY = int(os.getenv('TOGGL_MAX_CONCURRENCY', 8))
+TOGGL_RATE_LIMIT = float(os.getenv('TOGGL_RATE_LIMIT', 10))  # запросов в секунду
+TOGGL_RATE_BURST = int(os.getenv('TOGGL_RATE_BURST', 10))
+
+# Статистика текущего прогона; наследуется задачами, созданными внутри map()
+_current_run = contextvars.ContextVar('toggl_fanout_run', default=None)
+
+
+class TokenBucket:
+    """Токен-бакет: не больше rate запросов в секунду с запасом burst."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class FanOutStats:
+    """Счётчики одного прогона: сколько запросов ушло и сколько из них получили 429."""
+
+    def __init__(self, label, items):
+        self.label = label
+        self.items = items
+        self.requests = 0
+        self.rate_limited = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def format(self):
+        return (f"{self.label}: {self.items} задач, {self.requests} запросов, "
+                f"429: {self.rate_limited}, {self.elapsed:.2f} с, "
+                f"{self.throughput:.1f} запр/с")
+
+
+class FanOutScheduler:
+    """
+    Общий планировщик запросов к Toggl Plan API.
+
+    Ограничивает число одновременных запросов, выдаёт их не чаще, чем позволяет
+    токен-бакет, и при ответе 429 с Retry-After ставит на паузу сразу все
+    запросы, а не каждую корутину по отдельности.
+    """
+
+    def __init__(self, max_concurrency=TOGGL_MAX_CONCURRENCY, rate=TOGGL_RATE_LIMIT,
+                 burst=TOGGL_RATE_BURST):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.resume_at = 0.0
+        self.last_run = None
+
+    async def _wait_backoff(self):
+        delay = self.resume_at - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.resume_at - time.monotonic()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.semaphore:
+            await self._wait_backoff()
+            await self.bucket.acquire()
+            run = _current_run.get()
+            if run is not None:
+                run.requests += 1
+            yield
+
+    def backoff(self, retry_after):
+        self.resume_at = max(self.resume_at, time.monotonic() + retry_after)
+        run = _current_run.get()
+        if run is not None:
+            run.rate_limited += 1
+        logger.warning(f"Rate limit exceeded. Все запросы приостановлены на {retry_after} с")
+
+    async def map(self, func, items, label='fan-out', on_result=None):
+        """
+        Выполняет func для каждого элемента и возвращает результаты в исходном порядке.
+
+        on_result(done, total, result) вызывается по мере готовности результатов,
+        чтобы показывать прогресс, не дожидаясь всей пачки.
+        """
+        items = list(items)
+        if not items:
+            return []
+        stats = FanOutStats(label, len(items))
+        token = _current_run.set(stats)
+
+        async def run(index, item):
+            return index, await func(item)
+
+        tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+        results = [None] * len(items)
+        try:
+            for done, future in enumerate(asyncio.as_completed(tasks), start=1):
+                index, result = await future
+                results[index] = result
+                if on_result is not None:
+                    on_result(done, len(items), result)
+            return results
+        finally:
+            for task in tasks:
+                task.cancel()
+            _current_run.reset(token)
+            stats.finished_at = time.monotonic()
+            self.last_run = stats
+            logger.info(stats.format())
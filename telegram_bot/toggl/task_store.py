@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+
+from telegram_bot.toggl.fetch_strategy import split_by_detail_need, task_list_params
+from telegram_bot.toggl.aggregation import task_fields
+
+logger = logging.getLogger(__name__)
+
+# Локальное хранилище задач Toggl Plan
+TOGGL_DB_PATH = os.getenv('TOGGL_DB_PATH', 'data/toggl.sqlite3')
+# Как часто (в секундах) сверяться с API; в промежутках отчёты строятся только из базы
+TOGGL_SYNC_INTERVAL = float(os.getenv('TOGGL_SYNC_INTERVAL', 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    position INTEGER,
+    marker TEXT,
+    task TEXT NOT NULL,
+    detail TEXT,
+    project TEXT,
+    status TEXT,
+    members TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Поля деталей для отчётов, извлечённые при записи: таблица задач строится без разбора JSON
+REPORT_COLUMNS = ('project', 'status', 'members')
+
+
+def report_values(detail):
+    """Значения REPORT_COLUMNS для деталей задачи (None — деталей нет)."""
+    if detail is None:
+        return None, None, None
+    project, status, members = task_fields(detail)
+    return project, status, json.dumps(members, ensure_ascii=False, separators=(',', ':'))
+
+
+def change_marker(task):
+    """
+    Маркер изменения задачи: updated_at, если API его отдаёт,
+    иначе хэш содержимого задачи из списка.
+    """
+    if task.get('updated_at'):
+        return str(task['updated_at'])
+    payload = json.dumps(task, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class TaskStore:
+    """
+    Задачи и их детали из Toggl Plan в локальной SQLite.
+
+    sync() скачивает список /tasks и запрашивает детали только для новых
+    и изменившихся задач, у которых в списке нет нужных отчётам полей;
+    отчёты читают данные из базы в порядке списка API (колонка position).
+    data_version меняется, только когда синхронизация действительно изменила
+    задачи или их порядок, — по нему кэшируются построенные из базы структуры.
+    Работа с SQLite в sync выполняется в потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, path=TOGGL_DB_PATH, sync_interval=TOGGL_SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Соединение используется и из потоков asyncio.to_thread; записи сериализует _lock
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+        return self._conn
+
+    def _migrate(self):
+        # В базах прежних версий нет колонок отчётов — добавляем и заполняем из деталей
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if 'position' not in columns:
+            # Прежние версии отдавали задачи в порядке rowid — сохраняем его до следующей синхронизации
+            with self._conn:
+                self._conn.execute("ALTER TABLE tasks ADD COLUMN position INTEGER")
+                self._conn.execute("UPDATE tasks SET position = rowid")
+            logger.info("База задач дополнена колонкой position")
+        missing = [column for column in REPORT_COLUMNS if column not in columns]
+        if not missing:
+            return
+        with self._conn:
+            for column in missing:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+            rows = self._conn.execute("SELECT id, detail FROM tasks WHERE detail IS NOT NULL").fetchall()
+            self._conn.executemany(
+                "UPDATE tasks SET project = ?, status = ?, members = ? WHERE id = ?",
+                [(*report_values(json.loads(detail)), task_id) for task_id, detail in rows])
+        logger.info(f"База задач дополнена колонками {', '.join(missing)}")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)))
+
+    @property
+    def synced_at(self):
+        return self._get_meta('synced_at', 0)
+
+    @property
+    def data_version(self):
+        return self._get_meta('data_version', 0)
+
+    def members(self):
+        return self._get_meta('members')
+
+    def tasks(self):
+        rows = self.conn.execute("SELECT task FROM tasks ORDER BY position")
+        return [json.loads(task) for task, in rows]
+
+    def details(self, task_ids):
+        task_ids = list(task_ids)
+        found = {}
+        # Запросы порциями, чтобы не упереться в лимит параметров SQLite
+        for i in range(0, len(task_ids), 500):
+            chunk = task_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, detail FROM tasks WHERE detail IS NOT NULL AND id IN ({placeholders})",
+                chunk)
+            for task_id, detail in rows:
+                found[task_id] = json.loads(detail)
+        return [found[task_id] for task_id in task_ids if task_id in found]
+
+    def report_rows(self):
+        """(id, проект, статус, участники в JSON) задач с деталями в порядке списка API."""
+        return self.conn.execute(
+            "SELECT id, project, status, members FROM tasks WHERE detail IS NOT NULL ORDER BY position"
+        ).fetchall()
+
+    async def sync(self, client, force=False, progress=None):
+        """
+        Синхронизирует базу с API. Возвращает текст ошибки или None.
+
+        Если с прошлой синхронизации прошло меньше sync_interval секунд,
+        запросов к API нет вовсе. progress(done, total, task_detail)
+        вызывается по мере загрузки деталей задач.
+        """
+        async with self._lock:
+            if not force and time.time() - self.synced_at < self.sync_interval:
+                return None
+
+            workspace_members = await client.get_workspace_members()
+            if "error" in workspace_members:
+                return self._sync_failed(workspace_members["error"],
+                                         "Ошибка получения информации о пользователях")
+
+            all_tasks = await client.get_all_tasks(task_list_params())
+            if "error" in all_tasks:
+                return self._sync_failed(all_tasks["error"], all_tasks["error"])
+
+            known = await asyncio.to_thread(self._known_markers)
+            markers = {task['id']: change_marker(task) for task in all_tasks}
+            changed_tasks = [task for task in all_tasks
+                             if known.get(task['id'], (None,))[0] != markers[task['id']]]
+            changed = {task['id'] for task in changed_tasks}
+
+            # Если нужные отчётам поля уже есть в списке, /tasks/{id} не запрашиваем
+            details, detail_ids = split_by_detail_need(changed_tasks)
+            responses = await client.get_task_details(detail_ids, label='sync', on_result=progress)
+            for task_id, task_detail in zip(detail_ids, responses):
+                if "error" not in task_detail:
+                    details[task_id] = task_detail
+
+            stale_ids = await asyncio.to_thread(
+                self._write_sync, all_tasks, markers, known, changed, details, workspace_members)
+
+            logger.info(f"Синхронизация задач: всего {len(all_tasks)}, "
+                        f"обновлено {len(details)} из {len(changed)}, удалено {len(stale_ids)}")
+            return None
+
+    def _known_markers(self):
+        """id -> (маркер, позиция) задач с деталями; по позиции замечаем смену порядка."""
+        rows = self.conn.execute("SELECT id, marker, position FROM tasks WHERE detail IS NOT NULL")
+        return {task_id: (marker, position) for task_id, marker, position in rows}
+
+    def _write_sync(self, all_tasks, markers, known, changed, details, workspace_members):
+        """Записывает результат синхронизации одной транзакцией; возвращает id удалённых задач."""
+        reordered = False
+        with self.conn:
+            for position, task in enumerate(all_tasks):
+                task_id = task['id']
+                if task_id in known and task_id not in changed:
+                    reordered = reordered or known[task_id][1] != position
+                    self.conn.execute("UPDATE tasks SET task = ?, position = ? WHERE id = ?",
+                                      (json.dumps(task, ensure_ascii=False), position, task_id))
+                    continue
+                detail = details.get(task_id)
+                # Без деталей маркер не сохраняем, чтобы повторить запрос в следующий раз
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO tasks "
+                    "(id, position, marker, task, detail, project, status, members) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (task_id, position,
+                     markers[task_id] if detail is not None else None,
+                     json.dumps(task, ensure_ascii=False),
+                     json.dumps(detail, ensure_ascii=False) if detail is not None else None,
+                     *report_values(detail)))
+
+            current_ids = set(markers)
+            stale_ids = [task_id for task_id, in self.conn.execute("SELECT id FROM tasks")
+                         if task_id not in current_ids]
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?",
+                                  [(task_id,) for task_id in stale_ids])
+
+            self._set_meta('members', workspace_members)
+            self._set_meta('synced_at', time.time())
+            if changed or stale_ids or reordered:
+                self._set_meta('data_version', self.data_version + 1)
+        return stale_ids
+
+    def _sync_failed(self, error, message):
+        logger.error(error)
+        if self.members() is not None:
+            logger.warning("Синхронизация не удалась, используются сохранённые данные")
+            return None
+        return message
+
+
+task_store = TaskStore()
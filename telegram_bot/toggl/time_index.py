@@ -0,0 +1,130 @@
+import time
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Поля задачи с датами, по которым строится индекс
+DATE_FIELDS = ('created_at', 'start_date', 'end_date')
+
+# Окна, доступные в меню кнопками
+PRESET_DAYS = (7, 30, 90)
+
+
+def parse_timestamp(value):
+    """Дата из API в секундах эпохи; даты без часового пояса считаются локальными."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        logger.warning(f"Не удалось разобрать дату: {value}")
+        return None
+
+
+class TaskTimeIndex:
+    """
+    Отсортированные массивы дат задач: для каждого поля из DATE_FIELDS
+    время в секундах эпохи и id задачи в том же порядке.
+
+    Даты разбираются один раз при построении, выборка окна —
+    двоичный поиск (np.searchsorted) по каждому полю.
+    """
+
+    def __init__(self, tasks):
+        self.size = len(tasks)
+        # id в порядке хранилища: от него зависит порядок проектов с равным числом задач
+        self.ids = np.fromiter((task['id'] for task in tasks), dtype=np.int64, count=len(tasks))
+        self._id_order = np.argsort(self.ids, kind='stable')
+        self._aligned = {}
+        self._fields = {}
+        for field in DATE_FIELDS:
+            stamps = np.array([parse_timestamp(task.get(field)) for task in tasks], dtype=np.float64)
+            self._aligned[field] = stamps
+            present = ~np.isnan(stamps)
+            order = np.argsort(stamps[present], kind='stable')
+            self._fields[field] = (stamps[present][order], self.ids[present][order])
+
+    def between(self, field, since, until=None):
+        """id задач, у которых поле field попадает в [since, until]."""
+        stamps, ids = self._fields[field]
+        lo = np.searchsorted(stamps, since, side='left')
+        hi = len(stamps) if until is None else np.searchsorted(stamps, until, side='right')
+        return ids[lo:hi]
+
+    def active_between(self, since, until=None):
+        """id задач, созданных, начатых или закончившихся в окне."""
+        return np.unique(np.concatenate([self.between(field, since, until) for field in DATE_FIELDS]))
+
+    def created_between(self, since, until=None):
+        """id задач, созданных в окне."""
+        return self.between('created_at', since, until)
+
+    def stamps(self, field, ids):
+        """Значения поля field для задач ids (NaN — даты нет)."""
+        positions = self._id_order[np.searchsorted(self.ids[self._id_order], ids)]
+        return self._aligned[field][positions]
+
+
+class ReportWindow:
+    """
+    Окно отчёта: последние days дней или диапазон дат [since, until].
+
+    Границы «последних дней» считаются в момент запроса,
+    поэтому одно и то же окно можно хранить сколько угодно.
+    """
+
+    def __init__(self, days=None, since=None, until=None):
+        self.days = days
+        self.since = since
+        self.until = until
+
+    @classmethod
+    def last_days(cls, days):
+        return cls(days=days)
+
+    @classmethod
+    def between_dates(cls, since, until):
+        return cls(since=since, until=until)
+
+    @property
+    def key(self):
+        if self.days is not None:
+            return f"{self.days}d"
+        return f"{self.since:%Y%m%d}-{self.until:%Y%m%d}"
+
+    @property
+    def label(self):
+        if self.days is not None:
+            return f"{self.days} дн."
+        return f"{self.since:%d.%m.%Y}–{self.until:%d.%m.%Y}"
+
+    def bounds(self):
+        """(since, until) в секундах эпохи; until=None — до текущего момента."""
+        if self.days is not None:
+            return time.time() - self.days * 86400, None
+        since = datetime.combine(self.since, datetime.min.time())
+        until = datetime.combine(self.until, datetime.min.time()) + timedelta(days=1)
+        return since.timestamp(), until.timestamp() - 1e-6
+
+
+DEFAULT_WINDOW = ReportWindow.last_days(30)
+
+
+def parse_window(args):
+    """
+    Окно из аргументов команды: «14» — последние 14 дней,
+    «2024-09-01 2024-09-30» — диапазон дат. None, если разобрать не удалось.
+    """
+    try:
+        if len(args) == 1 and args[0].isdigit() and int(args[0]) > 0:
+            return ReportWindow.last_days(int(args[0]))
+        if len(args) == 2:
+            since, until = (datetime.strptime(arg, '%Y-%m-%d').date() for arg in args)
+            if since <= until:
+                return ReportWindow.between_dates(since, until)
+    except ValueError:
+        pass
+    return None
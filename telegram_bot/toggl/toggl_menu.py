@@ -4,10 +4,13 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext, CallbackQueryHandler, CommandHandler
 
 from telegram_bot.handlers.security_check import is_user_whitelisted
-from telegram_bot.toggl.stat_by_user import stat_by_user
-from telegram_bot.toggl.stat_by_projects import stat_by_projects
+from telegram_bot.toggl.reports import send_report, send_charts
 from telegram_bot.toggl.deadline_info import deadline_info
 from telegram_bot.toggl.calendar_add import generate_calendar_link
+from telegram_bot.toggl.api_client import toggl_client
+from telegram_bot.toggl.milestones import milestone_cache
+from telegram_bot.toggl.http_cache import response_cache
+from telegram_bot.toggl.time_index import DEFAULT_WINDOW, PRESET_DAYS, ReportWindow, parse_window
 
 # Настройка логирования
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -19,11 +22,38 @@ logger = logging.getLogger(__name__)
 function_names = {
     'stat_by_user': 'Stat by User',
     'stat_by_projects': 'Stat by Projects',
+    'workspace_overview': 'Workspace Overview',
     'deadline_info': 'Deadline Info',
     'add_to_calendar': 'Add to Calendar',
+    'refresh_stat_by_user': 'Refresh Stat by User',
+    'refresh_stat_by_projects': 'Refresh Stat by Projects',
+    'refresh_workspace_overview': 'Refresh Workspace Overview',
+    'refresh_deadline_info': 'Refresh Deadline Info',
+    'chart_stat_by_user': 'Stat by User Charts',
+    'chart_stat_by_projects': 'Stat by Projects Charts',
+    'chart_workspace_overview': 'Workspace Overview Charts',
+    'window_custom': 'Custom Window',
     'back': 'Back'
 }
 
+def current_window(context: CallbackContext):
+    # Окно отчётов выбирается каждым пользователем отдельно
+    return context.user_data.get('toggl_window', DEFAULT_WINDOW)
+
+
+def window_buttons(context: CallbackContext):
+    window = current_window(context)
+    buttons = []
+    for days in PRESET_DAYS:
+        label = f"{days}d"
+        if window.days == days:
+            label = f"• {label}"
+        buttons.append(InlineKeyboardButton(label, callback_data=f'window_{days}'))
+    custom_label = "Custom" if window.days in PRESET_DAYS else f"• {window.label}"
+    buttons.append(InlineKeyboardButton(custom_label, callback_data='window_custom'))
+    return buttons
+
+
 async def toggl_menu(update: Update, context: CallbackContext, edit_message=False, from_info=False) -> None:
     user_id = update.effective_user.id
     if not is_user_whitelisted(user_id):
@@ -35,6 +65,10 @@ async def toggl_menu(update: Update, context: CallbackContext, edit_message=Fals
             InlineKeyboardButton("Stat by User", callback_data='stat_by_user'),
             InlineKeyboardButton("Stat by Projects", callback_data='stat_by_projects')
         ],
+        [
+            InlineKeyboardButton("Workspace Overview", callback_data='workspace_overview')
+        ],
+        window_buttons(context),
         [
             InlineKeyboardButton("Deadline Info", callback_data='deadline_info')
         ],
@@ -83,21 +117,49 @@ async def button(update: Update, context: CallbackContext) -> None:
             logger.info("User chose to exit menu and delete message.")
             await query.delete_message()
             return
+        elif query.data == 'window_custom':
+            await query.message.reply_text(
+                "Отправьте /toggl_window <дней> или /toggl_window <ГГГГ-ММ-ДД> <ГГГГ-ММ-ДД>",
+                disable_notification=True)
+            return
+        elif query.data.startswith('window_'):
+            context.user_data['toggl_window'] = ReportWindow.last_days(int(query.data[len('window_'):]))
+            logger.info(f"Report window set to {current_window(context).label}")
+            await toggl_menu(update, context, edit_message=True)
+            return
 
         await query.delete_message()
 
-        if query.data == 'stat_by_user':
-            logger.debug("Calling stat_by_user function")
-            await stat_by_user(query, context)
-        elif query.data == 'stat_by_projects':
-            logger.debug("Calling stat_by_projects function")
-            await stat_by_projects(query, context)
+        if query.data in ('stat_by_user', 'stat_by_projects', 'workspace_overview'):
+            logger.debug(f"Sending {query.data} snapshot")
+            await send_report(query, context, query.data, window=current_window(context))
+        elif query.data in ('refresh_stat_by_user', 'refresh_stat_by_projects',
+                            'refresh_workspace_overview'):
+            logger.debug(f"Refreshing {query.data}")
+            await send_report(query, context, query.data[len('refresh_'):], refresh=True,
+                              window=current_window(context))
+        elif query.data in ('chart_stat_by_user', 'chart_stat_by_projects',
+                            'chart_workspace_overview'):
+            logger.debug(f"Rendering {query.data}")
+            await send_charts(query, context, query.data[len('chart_'):],
+                              window=current_window(context))
         elif query.data == 'deadline_info':
             logger.debug("Calling deadline_info function")
             await deadline_info(query, context)
+        elif query.data == 'refresh_deadline_info':
+            logger.debug("Refreshing deadline_info")
+            await deadline_info(query, context, refresh=True)
         elif query.data == 'add_to_calendar':
             logger.debug("Calling generate_calendar_link function")
             await generate_calendar_link(query, context)
+
+        stats = toggl_client.connection_stats()
+        logger.debug(f"Toggl connections: opened {stats['opened']}, reused {stats['reused']}")
+        cache_stats = milestone_cache.stats()
+        logger.debug(f"Milestone cache: hits {cache_stats['hits']}, misses {cache_stats['misses']}")
+        http_cache_stats = response_cache.stats()
+        logger.debug(f"Toggl HTTP cache: 304 {http_cache_stats['revalidated']}, "
+                     f"200 {http_cache_stats['refetched']}, {http_cache_stats['bytes']} bytes")
     except Exception as e:
         logger.error(f"Error handling button callback: {e}")
 
@@ -108,6 +170,21 @@ async def button(update: Update, context: CallbackContext) -> None:
 
 
 
+async def toggl_window(update: Update, context: CallbackContext) -> None:
+    if not is_user_whitelisted(update.effective_user.id):
+        await update.message.reply_text('Отказано в доступе.')
+        return
+
+    window = parse_window(context.args or [])
+    if window is None:
+        await update.message.reply_text(
+            "Формат: /toggl_window 14 или /toggl_window 2024-09-01 2024-09-30")
+        return
+    context.user_data['toggl_window'] = window
+    logger.info(f"Report window set to {window.label}")
+    await toggl_menu(update, context)
+
+
 toggl_menu_handler = CallbackQueryHandler(button)
 
 def register_handlers(app):
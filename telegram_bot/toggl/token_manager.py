@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+
+from telegram.ext import CallbackContext
+
+from telegram_bot.config import (TOGGL_ACCESS_TOKEN, TOGGL_REFRESH_TOKEN, TOGGL_CLIENT_ID,
+                                 TOGGL_CLIENT_SECRET, TOGGL_REDIRECT_URI)
+from telegram_bot.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://api.plan.toggl.com/api/v5/authenticate/token"
+# Файл с токенами OAuth, переживает перезапуск контейнера
+TOGGL_TOKEN_PATH = os.getenv('TOGGL_TOKEN_PATH', 'data/toggl_token.json')
+# За сколько секунд до истечения обновлять токен в фоне
+TOGGL_TOKEN_REFRESH_MARGIN = float(os.getenv('TOGGL_TOKEN_REFRESH_MARGIN', 300))
+# Как часто (в секундах) фоновая задача проверяет срок действия токена
+TOGGL_TOKEN_CHECK_INTERVAL = float(os.getenv('TOGGL_TOKEN_CHECK_INTERVAL', 60))
+
+
+class TokenManager:
+    """
+    Токены OAuth Toggl Plan: хранение, обмен кода авторизации и обновление.
+
+    Токены сохраняются в файл и читаются при старте; ACCESS_TOKEN и
+    TOGGL_REFRESH_TOKEN из окружения используются, пока файла нет.
+    Одновременные обновления сливаются в один запрос, ошибки обновления
+    только логируются — запросы к API получают текст ошибки, бот продолжает работу.
+    """
+
+    def __init__(self, http, client_id=TOGGL_CLIENT_ID, client_secret=TOGGL_CLIENT_SECRET,
+                 redirect_uri=TOGGL_REDIRECT_URI, path=TOGGL_TOKEN_PATH,
+                 access_token=TOGGL_ACCESS_TOKEN, refresh_token=TOGGL_REFRESH_TOKEN,
+                 refresh_margin=TOGGL_TOKEN_REFRESH_MARGIN):
+        self.http = http
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        # None — срок неизвестен (статический токен из окружения)
+        self.expires_at = None
+        self.refreshes = 0
+        self._refresh_task = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать токены Toggl из {self.path}: {e}")
+            return
+        self.access_token = saved.get('access_token') or self.access_token
+        self.refresh_token = saved.get('refresh_token') or self.refresh_token
+        self.expires_at = saved.get('expires_at')
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w',
+                  encoding='utf-8') as file:
+            json.dump({
+                'access_token': self.access_token,
+                'refresh_token': self.refresh_token,
+                'expires_at': self.expires_at,
+            }, file)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def can_refresh(self):
+        return bool(self.refresh_token and self.client_id and self.client_secret)
+
+    def expires_soon(self):
+        return self.expires_at is not None and time.time() >= self.expires_at - self.refresh_margin
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def token(self):
+        """Действующий токен доступа или None, если получить его не удалось."""
+        if self.access_token and not self.expired():
+            if self.expires_soon() and self.can_refresh:
+                # Токен ещё действует: обновляем в фоне, запрос не ждёт
+                self._start_refresh()
+            return self.access_token
+        await self.refresh()
+        return self.access_token if not self.expired() else None
+
+    async def headers(self):
+        token = await self.token()
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def _start_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def refresh(self, failed_token=None):
+        """
+        Обновляет токен; параллельные вызовы ждут один и тот же запрос.
+
+        failed_token — токен, на который API ответил 401: если его уже
+        заменили, повторно не обновляем.
+        """
+        if failed_token is not None and failed_token != self.access_token:
+            return True
+        if not self.can_refresh:
+            logger.error("Токен Toggl недействителен, а обновить его нечем: "
+                         "нужны TOGGL_REFRESH_TOKEN, TOGGL_CLIENT_ID и TOGGL_CLIENT_SECRET")
+            return False
+        return await asyncio.shield(self._start_refresh())
+
+    async def _refresh(self):
+        return await self._request_token({
+            'grant_type': 'refresh_token',
+            'refresh_token': self.refresh_token,
+            'redirect_uri': self.redirect_uri,
+        })
+
+    async def exchange_code(self, authorization_code):
+        """Первичный обмен кода авторизации на токены."""
+        return await self._request_token({
+            'grant_type': 'authorization_code',
+            'code': authorization_code,
+            'redirect_uri': self.redirect_uri,
+        })
+
+    async def _request_token(self, data):
+        credentials = base64.b64encode(
+            f'{self.client_id}:{self.client_secret}'.encode('utf-8')).decode('utf-8')
+        headers = {
+            'Authorization': f'Basic {credentials}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        try:
+            async with self.http.session.post(TOKEN_URL, headers=headers, data=data) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка получения токена Toggl ({data['grant_type']}): "
+                                 f"{response.status} {await response.text()}")
+                    return False
+                token_info = await response.json()
+        except Exception as e:
+            logger.error(f"Ошибка получения токена Toggl ({data['grant_type']}): {e}")
+            return False
+
+        self.access_token = token_info.get('access_token')
+        self.refresh_token = token_info.get('refresh_token') or self.refresh_token
+        expires_in = token_info.get('expires_in')
+        self.expires_at = time.time() + expires_in if expires_in else None
+        self.refreshes += 1
+        try:
+            self._save()
+        except OSError as e:
+            logger.error(f"Не удалось сохранить токены Toggl в {self.path}: {e}")
+        logger.info(f"Токен Toggl получен ({data['grant_type']}), действует "
+                    f"{expires_in or 'неизвестно сколько'} с")
+        return True
+
+
+async def refresh_token_if_needed(context: CallbackContext):
+    if token_manager.expires_soon() and token_manager.can_refresh:
+        await token_manager.refresh()
+
+
+def schedule_token_refresh(job_queue):
+    job_queue.run_repeating(refresh_token_if_needed, interval=TOGGL_TOKEN_CHECK_INTERVAL, first=1,
+                            name='toggl_token')
+
+
+# Общий менеджер токенов для всех запросов к Toggl
+token_manager = TokenManager(http_client)
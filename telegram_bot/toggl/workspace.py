@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import logging
+
+import numpy as np
+
+from telegram_bot.toggl.api_client import toggl_client
+from telegram_bot.toggl.task_store import task_store
+from telegram_bot.toggl.aggregation import task_frame_from_rows, user_stats, project_stats, burndown
+from telegram_bot.toggl.time_index import TaskTimeIndex, DEFAULT_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд обзор рабочего пространства считается свежим
+TOGGL_OVERVIEW_TTL = float(os.getenv('TOGGL_OVERVIEW_TTL', 60))
+
+
+def create_members_dict(workspace_members):
+    members_by_id = {}
+    members_by_membership_id = {}
+    members_by_name = {}
+
+    for member in workspace_members:
+        user_id = member['id']
+        membership_id = member['membership_id']
+        name = member['name']
+
+        members_by_id[user_id] = member
+        members_by_membership_id[membership_id] = member
+        members_by_name[name] = member
+
+    return members_by_id, members_by_membership_id, members_by_name
+
+
+class WorkspaceOverview:
+    """Статистика по пользователям и по проектам за окно, посчитанная за один проход."""
+
+    def __init__(self, table_data, project_data, window=DEFAULT_WINDOW, burndown=None, built_at=None):
+        self.table_data = table_data
+        self.project_data = project_data
+        self.window = window
+        # (концы дней окна, число незавершённых задач) для графика
+        self.burndown = burndown or ([], [])
+        self.built_at = built_at if built_at is not None else time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+
+# Обзоры по ключу окна; индекс дат и таблица задач по текущей версии данных хранилища
+_overviews = {}
+_overview_lock = asyncio.Lock()
+_time_index = None
+_time_index_version = None
+_task_frame = None
+_task_frame_version = None
+
+
+def get_time_index(store=task_store):
+    """Индекс дат задач; перестраивается только после синхронизации, изменившей задачи."""
+    global _time_index, _time_index_version
+    version = store.data_version
+    if _time_index is None or _time_index_version != version:
+        _time_index = TaskTimeIndex(store.tasks())
+        _time_index_version = version
+        logger.debug(f"Индекс дат построен по {_time_index.size} задачам")
+    return _time_index
+
+
+def get_task_frame(store=task_store):
+    """
+    TaskFrame по всем задачам хранилища в его порядке; перестраивается только
+    после синхронизации, изменившей задачи, окна отчётов выбираются из него масками.
+    """
+    global _task_frame, _task_frame_version
+    version = store.data_version
+    if _task_frame is None or _task_frame_version != version:
+        _task_frame = task_frame_from_rows(store.report_rows())
+        _task_frame_version = version
+        logger.debug(f"Таблица задач построена по {len(_task_frame)} задачам")
+    return _task_frame
+
+
+def window_burndown(frame, index, mask, since, until=None):
+    """Остаток задач окна по дням; завершением Done-задачи считается её end_date."""
+    until = until if until is not None else time.time()
+    task_ids = frame.tasks["task_id"].to_numpy()[mask].astype(np.int64)
+    is_done = (frame.tasks["status"] == "Done").to_numpy()[mask]
+    end_dates = index.stamps('end_date', task_ids)
+    # Done-задачи без end_date считаем завершёнными к концу окна
+    done_at = np.where(is_done, np.where(np.isnan(end_dates), until, end_dates), np.nan)
+    return burndown(index.stamps('created_at', task_ids), done_at, since, until)
+
+
+async def load_overview(client=toggl_client, store=task_store, force=False, progress=None,
+                        window=DEFAULT_WINDOW):
+    """
+    Возвращает WorkspaceOverview за окно window или текст ошибки.
+
+    Свежий результат (моложе TOGGL_OVERVIEW_TTL) отдаётся из памяти, поэтому
+    Stat by User и Stat by Projects подряд не синхронизируются дважды.
+    """
+    async with _overview_lock:
+        overview = _overviews.get(window.key)
+        if not force and overview is not None and overview.age < TOGGL_OVERVIEW_TTL:
+            return overview
+
+        error = await store.sync(client, force=force, progress=progress)
+        if error is not None:
+            return error
+
+        members_by_id, members_by_membership_id, members_by_name = create_members_dict(
+            store.members() or [])
+        if not (members_by_id and members_by_membership_id and members_by_name):
+            return "Ошибка получения информации о пользователях"
+
+        # У отчётов разные окна: по пользователям — любая из дат, по проектам — дата создания
+        index = get_time_index(store)
+        since, until = window.bounds()
+        user_task_ids = index.active_between(since, until)
+        project_task_ids = index.created_between(since, until)
+
+        frame = get_task_frame(store)
+        frame_task_ids = frame.tasks["task_id"].to_numpy()
+
+        user_mask = np.isin(frame_task_ids, user_task_ids)
+        project_mask = np.isin(frame_task_ids, project_task_ids)
+        overview = WorkspaceOverview(
+            user_stats(frame, members_by_id, members_by_membership_id, mask=user_mask),
+            project_stats(frame, mask=project_mask),
+            window,
+            window_burndown(frame, index, user_mask, since, until))
+        # Устаревшие обзоры произвольных окон не копим
+        for key in [key for key, cached in _overviews.items() if cached.age >= TOGGL_OVERVIEW_TTL]:
+            del _overviews[key]
+        _overviews[window.key] = overview
+        logger.info(f"Обзор рабочего пространства за {window.label} построен по {int(np.count_nonzero(user_mask | project_mask))} задачам")
+        return overview
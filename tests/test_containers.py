@@ -0,0 +1,114 @@
+import asyncio
+
+from docker.errors import NotFound
+from docker.models.containers import Container
+
+from telegram_bot.server.containers import ContainerStatsCollector, format_containers
+
+
+def make_stats(total, system, precpu=None):
+    return {
+        'cpu_stats': {'cpu_usage': {'total_usage': total}, 'system_cpu_usage': system, 'online_cpus': 2},
+        'precpu_stats': precpu or {},
+        'memory_stats': {'usage': 200 * 1024 * 1024, 'limit': 1024 * 1024 * 1024,
+                         'stats': {'inactive_file': 50 * 1024 * 1024}},
+        'networks': {'eth0': {'rx_bytes': 1000, 'tx_bytes': 2000}},
+    }
+
+
+class StubAPI:
+    """Счётчики CPU каждого контейнера растут с каждым вызовом stats."""
+
+    def __init__(self, precpu=False):
+        self.precpu = precpu
+        self.calls = {}
+
+    def stats(self, container_id, stream=False, one_shot=False):
+        calls = self.calls[container_id] = self.calls.get(container_id, 0) + 1
+        if self.precpu:
+            # Демон без one-shot: предыдущий замер приходит в том же ответе
+            return make_stats(2000, 20000, {'cpu_usage': {'total_usage': 1000}, 'system_cpu_usage': 10000})
+        return make_stats(calls * 1000, calls * 10000)
+
+
+class StubContainers:
+    """Коллекция контейнеров с ответами Docker API вместо сокета."""
+
+    def __init__(self, client, names, missing=()):
+        self.client = client
+        self.names = names
+        self.missing = set(missing)
+
+    def list(self, sparse=False):
+        # Как у настоящего API: в sparse-списке есть Names и State-строка, но нет Name
+        return [Container(attrs={'Id': f'{name}-id', 'Names': [f'/{name}'], 'State': 'running'},
+                          client=self.client, collection=self)
+                for name in self.names]
+
+    def get(self, container_id):
+        name = container_id[:-len('-id')]
+        if name in self.missing:
+            raise NotFound(f"No such container: {container_id}")
+        return Container(attrs={'Id': container_id, 'Name': f'/{name}',
+                                'State': {'Status': 'running'}, 'RestartCount': 1},
+                         client=self.client, collection=self)
+
+
+class StubClient:
+    def __init__(self, names, missing=(), precpu=False):
+        self.api = StubAPI(precpu)
+        self.containers = StubContainers(self, names, missing)
+
+
+def test_failed_container_keeps_name_and_report():
+    collector = ContainerStatsCollector(client_factory=lambda: StubClient(['web', 'db', 'gone'], missing=['gone']),
+                                        cpu_sample=0)
+    try:
+        results = asyncio.run(collector.collect())
+    finally:
+        collector.close()
+
+    assert [stats.name for stats in results] == ['db', 'gone', 'web']
+    gone = results[1]
+    assert gone.error and 'No such container' in gone.error
+    assert results[0].memory == 150 * 1024 * 1024
+    report = format_containers(results)
+    assert '• gone: ⚠️' in report
+    assert '• web: CPU' in report
+
+
+def collect_once(client):
+    collector = ContainerStatsCollector(client_factory=lambda: client, cpu_sample=0)
+    try:
+        return asyncio.run(collector.collect())
+    finally:
+        collector.close()
+
+
+def test_cpu_percent_on_first_collection():
+    # one-shot без precpu_stats: CPU по второму замеру относительно первого, уже при первом сборе
+    client = StubClient(['web', 'db'])
+    results = collect_once(client)
+
+    assert [stats.cpu for stats in results] == [1000 / 10000 * 2 * 100] * 2
+    assert client.api.calls == {'web-id': 2, 'db-id': 2}
+
+
+def test_cpu_percent_uses_precpu_when_present():
+    client = StubClient(['web'], precpu=True)
+    results = collect_once(client)
+
+    assert results[0].cpu == 1000 / 10000 * 2 * 100
+    assert client.api.calls == {'web-id': 1}
+
+
+def test_refresh_keeps_snapshot_for_report():
+    collector = ContainerStatsCollector(client_factory=lambda: StubClient(['web']), cpu_sample=0)
+    try:
+        assert collector.snapshot_at is None
+        results = asyncio.run(collector.refresh())
+    finally:
+        collector.close()
+
+    assert collector.snapshot is results and collector.snapshot_at is not None
+    assert format_containers(collector.snapshot, 3).startswith("🐳 Контейнеры (1, 3 с назад):")
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from telegram_bot.ai_tools.scheduler import RequestScheduler, QueuedRequest
+
+
+async def settle():
+    # Завершение задачи, колбэк и запуск следующей занимают несколько итераций цикла
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def predicted_and_actual(max_concurrent, chats):
+    """
+    Ставит запросы чатов chats по одному и для последнего возвращает обещанное
+    position() место и фактическое — по порядку запуска, когда выполняемые
+    запросы завершаются в порядке старта.
+    """
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=max_concurrent, chat_queue_limit=10)
+        started, done, releases = [], set(), {}
+
+        def request(label):
+            async def run():
+                started.append(label)
+                releases[label] = asyncio.Event()
+                await releases[label].wait()
+            return QueuedRequest(label, run)
+
+        last = len(chats) - 1
+        for i, chat in enumerate(chats):
+            if i == last:
+                predicted = scheduler.position(chat)
+                started_before = len(started)
+            position = scheduler.submit(chat, request(i))
+            assert position is not None
+            if i == last:
+                assert position == predicted
+            await settle()
+
+        while len(done) < len(chats):
+            running = [label for label in started if label not in done]
+            releases[running[0]].set()
+            done.add(running[0])
+            await settle()
+
+        actual = started.index(last) - started_before + 1
+        return predicted, actual if predicted else started.index(last) - started_before
+
+    return asyncio.run(scenario())
+
+
+SCENARIOS = [
+    (1, 'AAABC'),
+    (1, 'AABACBD'),
+    (2, 'AABBCDA'),
+    (2, 'ABCABCAD'),
+    (3, 'AAAABBCDEEF'),
+]
+
+
+@pytest.mark.parametrize('max_concurrent, chats', SCENARIOS)
+def test_position_matches_dispatch_order(max_concurrent, chats):
+    for end in range(1, len(chats) + 1):
+        predicted, actual = predicted_and_actual(max_concurrent, chats[:end])
+        assert predicted == actual, f"{chats[:end]}: обещано #{predicted}, запущен #{actual}"
+
+
+def test_new_chat_goes_before_running_chat_follow_ups():
+    # A выполняется, A2 и A3 ждут: B пойдёт следующим, C — вторым
+    assert predicted_and_actual(1, 'AAAB') == (1, 1)
+    assert predicted_and_actual(1, 'AAABC') == (2, 2)
+
+
+def test_cancelled_before_start_frees_slot():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1)
+        dropped = []
+
+        async def run():
+            await asyncio.sleep(10)
+
+        async def on_drop():
+            dropped.append('A')
+
+        scheduler.submit('A', QueuedRequest('A', run, on_drop))
+        scheduler.cancel_chat('A')
+        await settle()
+        return dropped, scheduler.stats()['running']
+
+    assert asyncio.run(scenario()) == (['A'], 0)
+
+
+def test_cancel_with_other_key_keeps_running_request():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1)
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+
+        scheduler.submit('A', QueuedRequest('first', run))
+        scheduler.submit('A', QueuedRequest('second', run))
+        await settle()
+        results = (scheduler.cancel('A', 'other'), scheduler.cancel('A', 'second'),
+                   scheduler.stats()['running'], scheduler.cancel('A', 'first'))
+        await settle()
+        return results + (scheduler.stats()['running'],)
+
+    assert asyncio.run(scenario()) == (False, True, 1, True, 0)
+
+
+def test_submit_rejects_when_chat_queue_is_full():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrent=1, chat_queue_limit=1)
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+
+        positions = [scheduler.submit('A', QueuedRequest(i, run)) for i in range(3)]
+        scheduler.cancel_chat('A')
+        await settle()
+        return positions
+
+    assert asyncio.run(scenario()) == [0, 1, None]
@@ -0,0 +1,81 @@
+import time
+
+from telegram_bot.ai_tools.session_store import SessionStore
+
+
+def make_store(tmp_path, **kwargs):
+    return SessionStore(path=str(tmp_path / 'sessions.sqlite3'), **kwargs)
+
+
+def test_deleted_session_stays_deleted_after_flush(tmp_path):
+    store = make_store(tmp_path)
+    conversation = store.create(1, "system")
+    store.flush()
+
+    # Генерация ответа держит ссылку на сессию, пока её завершают по /cancel
+    store.delete(1)
+    store.flush()
+    conversation.add("assistant", "поздний ответ")
+    store.updated(1, conversation)
+    store.flush()
+
+    assert store.get(1) is None
+    assert make_store(tmp_path).get(1) is None
+
+
+def test_evicted_session_in_use_stays_deleted(tmp_path):
+    store = make_store(tmp_path, max_bytes=1)
+    conversation = store.create(1, "system")
+    store.create(2, "system")
+    store.flush()
+    assert 1 not in store._sessions
+
+    store.delete(1)
+    store.flush()
+    store.updated(1, conversation)
+    store.flush()
+
+    assert store.get(1) is None
+
+
+def test_new_session_after_delete_is_saved(tmp_path):
+    store = make_store(tmp_path)
+    store.create(1, "system")
+    store.delete(1)
+    store.flush()
+
+    conversation = store.create(1, "system")
+    conversation.add("user", "вопрос")
+    store.updated(1, conversation)
+    store.flush()
+
+    assert make_store(tmp_path).get(1).messages() == [{"role": "user", "content": "вопрос"}]
+
+
+def test_evicted_session_in_use_is_not_reloaded_from_disk(tmp_path):
+    store = make_store(tmp_path, max_bytes=1)
+    conversation = store.create(1, "system")
+    store.flush()
+    store.create(2, "system")
+    assert 1 not in store._sessions
+
+    # Генерация ответа ещё держит сессию, а в чат пришло новое сообщение
+    assert store.get(1) is conversation
+    conversation.add("assistant", "ответ")
+    store.updated(1, conversation)
+    store.flush()
+
+    assert make_store(tmp_path).get(1).messages() == [{"role": "assistant", "content": "ответ"}]
+
+
+def test_session_loaded_from_disk_expires_by_timer(tmp_path):
+    store = make_store(tmp_path)
+    store.create(1, "system")
+    store.close()
+
+    restarted = make_store(tmp_path, ttl=60)
+    restarted.create(2, "system")
+    conversation = restarted.get(1)
+    assert conversation is not None
+    assert restarted.pop_idle(now=conversation.last_seen + 30) == []
+    assert restarted.pop_idle(now=time.time() + 61) == [1, 2]
@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+
+from telegram_bot.toggl import workspace
+from telegram_bot.toggl.aggregation import build_task_frame, task_frame_from_rows
+from telegram_bot.toggl.task_store import TaskStore
+
+MEMBERS = [{"id": 1, "membership_id": 10, "name": "user"}]
+
+
+def make_task(task_id, status="Done", updated_at="2024-01-01T00:00:00Z"):
+    return {"id": task_id, "updated_at": updated_at, "created_at": "2024-01-01T00:00:00Z",
+            "project": {"name": f"Project {task_id % 2}"}, "plan_status": {"name": status},
+            "workspace_members": [10] if task_id % 3 else []}
+
+
+class StubClient:
+    """Клиент Toggl, отдающий заданный список задач; детали уже есть в списке."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    async def get_workspace_members(self):
+        return MEMBERS
+
+    async def get_all_tasks(self, params=None):
+        return list(self.tasks)
+
+    async def get_task_details(self, task_ids, label='', on_result=None):
+        return [{"error": "не нужен"} for _ in task_ids]
+
+
+def sync(store, tasks):
+    return asyncio.run(store.sync(StubClient(tasks), force=True))
+
+
+def test_data_version_changes_only_with_tasks(tmp_path):
+    store = TaskStore(path=str(tmp_path / 'toggl.sqlite3'))
+    tasks = [make_task(task_id) for task_id in range(5)]
+    sync(store, tasks)
+    version = store.data_version
+
+    sync(store, tasks)
+    assert store.data_version == version
+
+    sync(store, tasks[:4] + [make_task(4, "Blocked", "2024-02-01T00:00:00Z")])
+    assert store.data_version == version + 1
+
+    sync(store, tasks[:3])
+    assert store.data_version == version + 2
+
+
+def test_task_frame_rebuilt_only_after_changes(tmp_path):
+    store = TaskStore(path=str(tmp_path / 'toggl.sqlite3'))
+    tasks = [make_task(task_id) for task_id in range(5)]
+    sync(store, tasks)
+    frame = workspace.get_task_frame(store)
+
+    sync(store, tasks)
+    assert workspace.get_task_frame(store) is frame
+
+    sync(store, tasks + [make_task(5)])
+    assert len(workspace.get_task_frame(store)) == 6
+
+
+def test_frame_from_rows_matches_frame_from_details(tmp_path):
+    store = TaskStore(path=str(tmp_path / 'toggl.sqlite3'))
+    tasks = [make_task(task_id, status) for task_id, status in
+             enumerate(["Done", None, "Blocked", "In progress", "Done", "To do"])]
+    tasks[2]["project"] = None
+    tasks[3]["workspace_members"] = [10, 11]
+    sync(store, tasks)
+
+    from_rows = task_frame_from_rows(store.report_rows())
+    from_details = build_task_frame(tasks)
+    assert from_rows.tasks.astype(str).equals(from_details.tasks.astype(str))
+    assert from_rows.memberships.equals(from_details.memberships)
+
+
+def test_tasks_keep_api_order(tmp_path):
+    store = TaskStore(path=str(tmp_path / 'toggl.sqlite3'))
+    tasks = [make_task(task_id) for task_id in (3, 1, 4, 2)]
+    sync(store, tasks)
+    assert [task['id'] for task in store.tasks()] == [3, 1, 4, 2]
+    assert [row[0] for row in store.report_rows()] == [3, 1, 4, 2]
+
+    version = store.data_version
+    sync(store, tasks[::-1])
+    assert [task['id'] for task in store.tasks()] == [2, 4, 1, 3]
+    assert store.data_version == version + 1
+
+
+def test_old_database_gets_report_columns(tmp_path):
+    path = str(tmp_path / 'toggl.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, marker TEXT, task TEXT NOT NULL, detail TEXT)")
+    conn.execute("INSERT INTO tasks VALUES (1, 'm', '{}', ?)",
+                 ('{"id": 1, "plan_status": {"name": "Done"}, "workspace_members": [10]}',))
+    conn.commit()
+    conn.close()
+
+    assert TaskStore(path=path).report_rows() == [(1, "Unknown", "Done", "[10]")]
+
+
+def test_time_index_rebuilt_only_after_changes(tmp_path):
+    store = TaskStore(path=str(tmp_path / 'toggl.sqlite3'))
+    tasks = [make_task(task_id) for task_id in range(5)]
+    sync(store, tasks)
+    index = workspace.get_time_index(store)
+
+    sync(store, tasks)
+    assert workspace.get_time_index(store) is index
+
+    sync(store, tasks + [make_task(5)])
+    assert workspace.get_time_index(store).size == 6